@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+
+"""
+Benchmark of CarlaClient against AsyncCarlaClient on the mock server.
+
+Each frame the client reads the measurements and the controller's camera
+rig, sends a control and spends --work milliseconds on blocking work
+standing in for rendering, inference or disk I/O. The sync client does the
+work after sending the control; the async client hands it to an executor
+and reads the next frame meanwhile.
+
+    python -m benchmarks.async_client --frames 100 --work 10
+"""
+
+import argparse
+import asyncio
+import time
+
+from carla.async_client import make_async_carla_client
+from carla.client import VehicleControl, make_carla_client
+from carla.mock_server import MockCarlaServer
+
+from .client_throughput import make_rig_settings
+
+
+def _work(seconds):
+    if seconds > 0.0:
+        time.sleep(seconds)
+
+
+def run_sync(port, settings, frames, work, zero_copy=False):
+    with make_carla_client('localhost', port, zero_copy=zero_copy) as client:
+        client.load_settings(settings)
+        client.start_episode(0)
+        start = time.perf_counter()
+        for _ in range(frames):
+            client.read_data()
+            client.send_control(VehicleControl())
+            _work(work)
+        return time.perf_counter() - start
+
+
+async def _run_async(port, settings, frames, work):
+    loop = asyncio.get_event_loop()
+    async with make_async_carla_client('localhost', port) as client:
+        await client.load_settings(settings)
+        await client.start_episode(0)
+        pending = None
+        start = time.perf_counter()
+        for _ in range(frames):
+            await client.read_data()
+            await client.send_control(VehicleControl())
+            if pending is not None:
+                await pending
+            pending = loop.run_in_executor(None, _work, work)
+        await pending
+        return time.perf_counter() - start
+
+
+def run_sync_zero_copy(port, settings, frames, work):
+    return run_sync(port, settings, frames, work, zero_copy=True)
+
+
+def run_async(port, settings, frames, work):
+    return asyncio.get_event_loop().run_until_complete(
+        _run_async(port, settings, frames, work))
+
+
+def main():
+    argparser = argparse.ArgumentParser(description=__doc__)
+    argparser.add_argument('--frames', default=100, type=int)
+    argparser.add_argument('--window-size', default='1024x768')
+    argparser.add_argument('--work', default=0.0, type=float, help='client work per frame (ms)')
+    args = argparser.parse_args()
+
+    window_size = tuple(int(x) for x in args.window_size.lower().split('x'))
+    settings = make_rig_settings(window_size)
+    print('%d frames, window %dx%d, work %.1f ms' % (
+        args.frames, window_size[0], window_size[1], args.work))
+    print('%-16s %10s' % ('client', 'frames/s'))
+    clients = [
+        ('sync', run_sync),
+        ('sync zero-copy', run_sync_zero_copy),
+        ('async', run_async)]
+    server = MockCarlaServer(world_port=0).start()
+    try:
+        for name, run in clients:
+            elapsed = run(server.world_port, settings, args.frames, args.work / 1000.0)
+            print('%-16s %10.1f' % (name, args.frames / elapsed))
+    finally:
+        server.stop()
+
+
+if __name__ == '__main__':
+    main()
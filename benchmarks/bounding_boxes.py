@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+
+"""
+Benchmark of the bounding box projection.
+
+Projects the boxes of synthetic agents around the player into a camera with
+a per-agent loop over carla.transform.Transform, building each box like the
+CARLA examples do, and with the batched carla.projection.BoxProjector,
+checks that both give the same corners and reports the frames per second.
+
+    python -m benchmarks.bounding_boxes --agents 200 --repeat 200
+"""
+
+import argparse
+import math
+import time
+
+import numpy
+
+from carla import sensor
+from carla.measurements import AGENT_DTYPE
+from carla.projection import BoxProjector
+from carla.transform import Transform, Translation, Rotation
+
+
+def legacy_project_boxes(camera, agents, player_transform):
+    """Per-agent projection with Transform objects, kept as the baseline."""
+    width, height = camera.ImageSizeX, camera.ImageSizeY
+    focal = width / (2.0 * math.tan(camera.FOV * math.pi / 360.0))
+    world_to_camera = (player_transform * camera.get_unreal_transform()).inverse()
+    result = []
+    for agent in agents:
+        extent = agent['extent']
+        offset = agent['box_offset']
+        corners = numpy.array([
+            [offset[0] + x * extent[0], offset[1] + y * extent[1], offset[2] + z * extent[2]]
+            for x in (1, -1) for y in (1, -1) for z in (1, -1)])
+        agent_transform = Transform(
+            Translation(*agent['location']), Rotation(*agent['rotation']))
+        points = (world_to_camera * agent_transform).transform_points(corners)
+        if points[:, 2].min() <= 0.1 or points[:, 2].min() >= 100.0:
+            continue
+        pixels = []
+        for x, y, z in points:
+            pixels.append((
+                (width - 1) - (x * focal / z + width / 2.0),
+                (height - 1) - (y * focal / z + height / 2.0)))
+        pixels = numpy.array(pixels)
+        low, high = pixels.min(axis=0), pixels.max(axis=0)
+        if high[0] >= -0.5 and low[0] <= width - 0.5 and high[1] >= -0.5 and low[1] <= height - 0.5:
+            result.append((agent['id'], pixels))
+    return result
+
+
+def make_agents(count, radius=80.0):
+    """Vehicles with random poses around the origin."""
+    agents = numpy.zeros(count, dtype=AGENT_DTYPE)
+    agents['id'] = numpy.arange(count)
+    agents['location'][:, 0:2] = numpy.random.uniform(-radius, radius, (count, 2))
+    agents['rotation'][:, 1] = numpy.random.uniform(-180.0, 180.0, count)
+    agents['yaw'] = agents['rotation'][:, 1]
+    agents['box_offset'][:, 2] = 0.7
+    agents['extent'] = (2.3, 1.0, 0.7)
+    return agents
+
+
+def _time(function, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        function()
+    return repeat / (time.perf_counter() - start)
+
+
+def main():
+    argparser = argparse.ArgumentParser(description=__doc__)
+    argparser.add_argument('--agents', default=200, type=int)
+    argparser.add_argument('--repeat', default=200, type=int)
+    args = argparser.parse_args()
+
+    camera = sensor.Camera('RGBCameraCenter')
+    camera.set_image_size(300, 180)
+    camera.set_position(2.0, 0.0, 1.4)
+    player_transform = Transform(Translation(0.0, 0.0, 0.2), Rotation(yaw=30.0))
+    agents = make_agents(args.agents)
+    projector = BoxProjector(camera)
+
+    legacy = legacy_project_boxes(camera, agents, player_transform)
+    boxes = projector.project({'vehicle': agents}, player_transform)
+    assert [agent_id for agent_id, _ in legacy] == boxes['id'].tolist()
+    assert all(
+        numpy.allclose(pixels, corners, atol=1e-3)
+        for (_, pixels), corners in zip(legacy, boxes['corners']))
+
+    print('%d agents, %d boxes in view' % (args.agents, len(boxes)))
+    print('%-28s %12s' % ('projection', 'frames/s'))
+    print('%-28s %12.1f' % (
+        'legacy per-agent',
+        _time(lambda: legacy_project_boxes(camera, agents, player_transform), args.repeat)))
+    print('%-28s %12.1f' % (
+        'batched',
+        _time(lambda: projector.project({'vehicle': agents}, player_transform), args.repeat)))
+
+
+if __name__ == '__main__':
+    main()
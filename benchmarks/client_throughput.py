@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+
+"""
+End-to-end throughput of CarlaClient against the mock server.
+
+Requests the controller's sensor rig (two game cameras at window size and
+five dataset cameras at output size, optionally a lidar) from a local
+carla.mock_server and runs the read_data/send_control loop with each
+client configuration.
+
+    python -m benchmarks.client_throughput --frames 100 --vehicles 50
+"""
+
+import argparse
+import time
+
+from carla import sensor
+from carla.arena import FrameArena
+from carla.client import VehicleControl, make_carla_client
+from carla.mock_server import MockCarlaServer
+from carla.settings import CarlaSettings
+
+
+def make_rig_settings(window_size=(1024, 768), output_size=(300, 180), lidar=False,
+                      number_of_vehicles=25, number_of_pedestrians=0):
+    """CarlaSettings with the sensor rig of controller.py."""
+    settings = CarlaSettings()
+    settings.set(
+        SynchronousMode=True,
+        SendNonPlayerAgentsInfo=True,
+        NumberOfVehicles=number_of_vehicles,
+        NumberOfPedestrians=number_of_pedestrians)
+    cameras = [
+        ('GameCamera', window_size, 'SceneFinal'),
+        ('GameCamera3p', window_size, 'SceneFinal'),
+        ('RGBCameraCenter', output_size, 'SceneFinal'),
+        ('RGBCameraLeft', output_size, 'SceneFinal'),
+        ('RGBCameraRight', output_size, 'SceneFinal'),
+        ('DepthCamera', output_size, 'Depth'),
+        ('SemSegCamera', output_size, 'SemanticSegmentation')]
+    for name, size, post_processing in cameras:
+        camera = sensor.Camera(name, PostProcessing=post_processing)
+        camera.set_image_size(*size)
+        settings.add_sensor(camera)
+    if lidar:
+        settings.add_sensor(sensor.Lidar('Lidar'))
+    return settings
+
+
+def run(port, settings, frames, **kwargs):
+    """Return the frames per second and MB per second of the loop."""
+    received = 0
+    with make_carla_client('localhost', port, **kwargs) as client:
+        client.load_settings(settings)
+        client.start_episode(0)
+        start = time.perf_counter()
+        for _ in range(frames):
+            measurements, sensor_data = client.read_data()
+            measurements.player_measurements.forward_speed
+            for data in sensor_data.values():
+                if isinstance(data, sensor.Image):
+                    received += len(data.raw_data)
+                data.release()
+            client.send_control(VehicleControl(throttle=0.5))
+        elapsed = time.perf_counter() - start
+    return frames / elapsed, received / elapsed / 1e6
+
+
+def main():
+    argparser = argparse.ArgumentParser(description=__doc__)
+    argparser.add_argument('--frames', default=100, type=int)
+    argparser.add_argument('--window-size', default='1024x768')
+    argparser.add_argument('--output-size', default='300x180')
+    argparser.add_argument('--vehicles', default=25, type=int)
+    argparser.add_argument('--pedestrians', default=0, type=int)
+    argparser.add_argument('--lidar', action='store_true')
+    args = argparser.parse_args()
+
+    def size(text):
+        return tuple(int(x) for x in text.lower().split('x'))
+
+    settings = make_rig_settings(
+        size(args.window_size), size(args.output_size), args.lidar,
+        args.vehicles, args.pedestrians)
+    clients = [
+        ('default', {}),
+        ('zero-copy', {'zero_copy': True}),
+        ('arena', {'frame_arena': FrameArena()}),
+        ('arena + lazy', {'frame_arena': FrameArena(), 'lazy_measurements': True})]
+
+    server = MockCarlaServer(world_port=0).start()
+    try:
+        print('%-14s %10s %10s' % ('client', 'frames/s', 'MB/s'))
+        for name, kwargs in clients:
+            fps, throughput = run(server.world_port, settings, args.frames, **kwargs)
+            print('%-14s %10.1f %10.1f' % (name, fps, throughput))
+    finally:
+        server.stop()
+
+
+if __name__ == '__main__':
+    main()
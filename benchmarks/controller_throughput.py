@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+
+"""
+Frames per second of controller.py against the mock server.
+
+Runs one episode of CarlaController on autopilot with recording started
+automatically, in the interactive mode (a pygame window, on SDL's dummy
+video driver unless one is set) and in the headless mode, with the same
+settings, and reports the frames per second of each.
+
+    python -m benchmarks.controller_throughput --frames 300
+"""
+
+import argparse
+import configparser
+import logging
+import os
+import shutil
+import tempfile
+import time
+
+from carla.arena import FrameArena
+from carla.client import make_carla_client
+from carla.mock_server import MockCarlaServer
+
+import controller
+
+
+def run(port, settings, output_path, headless):
+    """Return the frames run and the frames per second of one episode."""
+    args = argparse.Namespace(
+        headless=headless,
+        joystick=False,
+        record_video=False,
+        output_path=output_path,
+        drive_model_path=None)
+    with make_carla_client('localhost', port, frame_arena=FrameArena()) as client:
+        game = controller.CarlaController(client, args, settings)
+        start = time.perf_counter()
+        game.execute()
+        elapsed = time.perf_counter() - start
+        if game._last_recorder is not None:
+            game._last_recorder.join()
+    return game._timer.frame, game._timer.frame / elapsed
+
+
+def main():
+    argparser = argparse.ArgumentParser(description=__doc__)
+    argparser.add_argument('--frames', default=300, type=int)
+    argparser.add_argument('--settings', default='settings.ini')
+    args = argparser.parse_args()
+
+    logging.basicConfig(format='%(levelname)s: %(message)s', level=logging.INFO)
+    os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+
+    settings = configparser.ConfigParser()
+    settings.read(args.settings)
+    settings.read_dict({'Controller': {
+        'AutoStartRecording': 'yes',
+        'FrameLimit': str(args.frames),
+        'EpisodeLimit': '1'}})
+
+    modes = [('interactive', False), ('headless', True)]
+    server = MockCarlaServer(world_port=0).start()
+    output_path = tempfile.mkdtemp()
+    try:
+        results = []
+        for name, headless in modes:
+            try:
+                results.append((name,) + run(server.world_port, settings, output_path, headless))
+            except ImportError as error:
+                print('skipping %s mode: %s' % (name, error))
+        print('%-12s %8s %10s' % ('mode', 'frames', 'frames/s'))
+        for name, frames, fps in results:
+            print('%-12s %8d %10.1f' % (name, frames, fps))
+    finally:
+        server.stop()
+        shutil.rmtree(output_path)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,166 @@
+#!/usr/bin/env python3
+
+"""
+Benchmark of the carla.image_converter conversions.
+
+Converts synthetic camera frames at the controller's output (300x180) and
+window (1024x768) resolutions with the original implementations and the
+current ones, checks that both give the same values (up to one gray level
+for the uint8 log depth) and reports the frames converted per second. Then
+compares converting a stack of frames image by image with the batch
+conversions, which make a single call over the whole stack.
+
+    python -m benchmarks.image_converter --repeat 200
+"""
+
+import argparse
+import time
+
+import numpy
+
+from carla import image_converter as ic
+from carla import sensor
+
+
+RESOLUTIONS = ((300, 180), (1024, 768))
+
+
+def legacy_labels_to_cityscapes_palette(image):
+    """The original per-class implementation, kept as the baseline."""
+    classes = {
+        0: [0, 0, 0],         # None
+        1: [70, 70, 70],      # Buildings
+        2: [190, 153, 153],   # Fences
+        3: [72, 0, 90],       # Other
+        4: [220, 20, 60],     # Pedestrians
+        5: [153, 153, 153],   # Poles
+        6: [157, 234, 50],    # RoadLines
+        7: [128, 64, 128],    # Roads
+        8: [244, 35, 232],    # Sidewalks
+        9: [107, 142, 35],    # Vegetation
+        10: [0, 0, 255],      # Vehicles
+        11: [102, 102, 156],  # Walls
+        12: [220, 220, 0]     # TrafficSigns
+    }
+    array = ic.labels_to_array(image)
+    result = numpy.zeros((array.shape[0], array.shape[1], 3))
+    for key, value in classes.items():
+        result[numpy.where(array == key)] = value
+    return result
+
+
+def legacy_depth_to_array(image):
+    """The original float64 depth decoding, kept as the baseline."""
+    array = ic.to_bgra_array(image)
+    array = array.astype(numpy.float32)
+    normalized_depth = numpy.dot(array[:, :, :3], [65536.0, 256.0, 1.0])
+    normalized_depth /= 16777215.0
+    return normalized_depth
+
+
+def legacy_depth_to_logarithmic_grayscale(image):
+    """The original three-channel float64 log depth, kept as the baseline."""
+    normalized_depth = legacy_depth_to_array(image)
+    logdepth = numpy.ones(normalized_depth.shape) + \
+        (numpy.log(normalized_depth) / 5.70378)
+    logdepth = numpy.clip(logdepth, 0.0, 1.0)
+    logdepth *= 255.0
+    return numpy.repeat(logdepth[:, :, numpy.newaxis], 3, axis=2)
+
+
+def make_depth_image(width, height):
+    """Depth frame with random encoded depths."""
+    array = numpy.random.randint(0, 256, (height, width, 4), dtype=numpy.uint8)
+    return sensor.Image(0, width, height, 'Depth', 90.0, array.tobytes())
+
+
+def make_labels_image(width, height):
+    """Semantic segmentation frame with random labels, unknown ones included."""
+    array = numpy.random.randint(0, 256, (height, width, 4), dtype=numpy.uint8)
+    array[:, :, 2] = numpy.random.randint(0, 15, (height, width))
+    return sensor.Image(0, width, height, 'SemanticSegmentation', 90.0, array.tobytes())
+
+
+def _time(function, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        function()
+    return repeat / (time.perf_counter() - start)
+
+
+def _print_row(name, width, height, legacy_fps, fps):
+    print('%-24s %10s %14.1f %14.1f %8.1fx' % (
+        name, '%dx%d' % (width, height), legacy_fps, fps, fps / legacy_fps))
+
+
+def main():
+    numpy.seterr(divide='ignore')
+    argparser = argparse.ArgumentParser(description=__doc__)
+    argparser.add_argument('--repeat', default=200, type=int)
+    argparser.add_argument('--batch', default=64, type=int)
+    args = argparser.parse_args()
+
+    print('%-24s %10s %14s %14s %9s' % ('conversion', 'size', 'legacy (f/s)', 'current (f/s)', 'speedup'))
+    for width, height in RESOLUTIONS:
+        image = make_labels_image(width, height)
+        out = numpy.empty((height, width, 3), dtype=numpy.uint8)
+        assert numpy.array_equal(
+            legacy_labels_to_cityscapes_palette(image),
+            ic.labels_to_cityscapes_palette(image, out=out))
+        _print_row(
+            'cityscapes palette', width, height,
+            _time(lambda: legacy_labels_to_cityscapes_palette(image), args.repeat),
+            _time(lambda: ic.labels_to_cityscapes_palette(image, out=out), args.repeat))
+
+        image = make_depth_image(width, height)
+        depth = numpy.empty((height, width), dtype=numpy.float32)
+        assert numpy.allclose(legacy_depth_to_array(image), ic.depth_to_array(image, out=depth))
+        _print_row(
+            'depth', width, height,
+            _time(lambda: legacy_depth_to_array(image), args.repeat),
+            _time(lambda: ic.depth_to_array(image, out=depth), args.repeat))
+
+        # The uint8 image is the rounded legacy output, float32 rounding can
+        # flip a value lying on .5 by one level.
+        gray = numpy.empty((height, width, 3), dtype=numpy.uint8)
+        legacy = numpy.rint(legacy_depth_to_logarithmic_grayscale(image))
+        current = ic.depth_to_logarithmic_uint8(image, out=gray, channels=3, work=depth)
+        assert numpy.abs(legacy - current).max() <= 1
+        _print_row(
+            'log depth, 3 channels', width, height,
+            _time(lambda: legacy_depth_to_logarithmic_grayscale(image), args.repeat),
+            _time(lambda: ic.depth_to_logarithmic_uint8(
+                image, out=gray, channels=3, work=depth), args.repeat))
+        _print_row(
+            'log depth, 1 channel', width, height,
+            _time(lambda: legacy_depth_to_logarithmic_grayscale(image), args.repeat),
+            _time(lambda: ic.depth_to_logarithmic_uint8(
+                image, out=gray[:, :, 0], work=depth), args.repeat))
+
+    print()
+    print('%-24s %10s %14s %14s %9s' % (
+        'batch of %d' % args.batch, 'size', 'loop (f/s)', 'batch (f/s)', 'speedup'))
+    repeat = max(1, args.repeat // args.batch)
+    for width, height in RESOLUTIONS:
+        batches = [
+            ('depth', make_depth_image, ic.depth_to_array, ic.depth_batch),
+            ('labels', make_labels_image, ic.labels_to_array, ic.labels_batch),
+            ('cityscapes palette', make_labels_image,
+             ic.labels_to_cityscapes_palette, ic.palette_batch)]
+        for name, make_image, convert, convert_batch in batches:
+            images = [make_image(width, height) for _ in range(args.batch)]
+            stacked = ic.to_bgra_batch(images)
+            batch = numpy.array(convert_batch(stacked))
+            assert all(numpy.array_equal(batch[i], convert(x)) for i, x in enumerate(images))
+
+            def loop():
+                return numpy.stack([convert(image) for image in images])
+
+            _print_row(
+                name, width, height,
+                _time(loop, repeat) * args.batch,
+                _time(lambda: convert_batch(stacked, out=batch), repeat) * args.batch)
+
+
+if __name__ == '__main__':
+    main()
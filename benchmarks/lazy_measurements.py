@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+
+"""
+Benchmark of Measurements parsing against LazyMeasurements.
+
+For 0, 50 and 200 non-player agents, times a full ParseFromString, a lazy
+parse reading only the player measurements, and a lazy parse that then
+touches the non-player agents.
+
+    python -m benchmarks.lazy_measurements --repeat 2000
+"""
+
+import argparse
+import random
+import time
+
+from carla.client import carla_protocol
+from carla.measurements import LazyMeasurements
+
+
+def make_measurements(agent_count):
+    message = carla_protocol.Measurements()
+    message.frame_number = 1234
+    message.platform_timestamp = 5678
+    message.game_timestamp = 91011
+    player = message.player_measurements
+    player.transform.location.x = 120.5
+    player.transform.rotation.yaw = 90.0
+    player.forward_speed = 8.3
+    player.autopilot_control.throttle = 0.5
+    for index in range(agent_count):
+        agent = message.non_player_agents.add()
+        agent.id = index
+        kind = index % 4
+        if kind == 0:
+            value = agent.vehicle
+            value.forward_speed = random.random()
+            value.bounding_box.extent.x = 2.0
+            value.bounding_box.extent.y = 1.0
+            value.bounding_box.extent.z = 0.8
+        elif kind == 1:
+            value = agent.pedestrian
+            value.forward_speed = random.random()
+            value.bounding_box.extent.x = 0.3
+        elif kind == 2:
+            value = agent.traffic_light
+            value.state = carla_protocol.TrafficLight.RED
+        else:
+            value = agent.speed_limit_sign
+            value.speed_limit = 8.33
+        value.transform.location.x = random.uniform(0.0, 400.0)
+        value.transform.location.y = random.uniform(0.0, 400.0)
+        value.transform.rotation.yaw = random.uniform(-180.0, 180.0)
+    return message.SerializeToString()
+
+
+def _full(data):
+    message = carla_protocol.Measurements()
+    message.ParseFromString(data)
+    return message.player_measurements.forward_speed
+
+
+def _lazy(data):
+    return LazyMeasurements(data).player_measurements.forward_speed
+
+
+def _lazy_agents(data):
+    return len(LazyMeasurements(data).non_player_agents)
+
+
+def _time(function, data, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        function(data)
+    return (time.perf_counter() - start) / repeat * 1e6
+
+
+def main():
+    argparser = argparse.ArgumentParser(description=__doc__)
+    argparser.add_argument('--repeat', default=2000, type=int)
+    args = argparser.parse_args()
+
+    print('%-8s %8s %12s %12s %14s' % ('agents', 'bytes', 'full (us)', 'lazy (us)', 'lazy+agents'))
+    for agent_count in (0, 50, 200):
+        data = make_measurements(agent_count)
+        assert _full(data) == _lazy(data)
+        print('%-8d %8d %12.1f %12.1f %14.1f' % (
+            agent_count,
+            len(data),
+            _time(_full, data, args.repeat),
+            _time(_lazy, data, args.repeat),
+            _time(_lazy_agents, data, args.repeat)))
+
+
+if __name__ == '__main__':
+    main()
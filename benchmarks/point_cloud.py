@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+
+"""
+Benchmark of the point cloud conversions.
+
+Converts a synthetic depth frame to a local point cloud with the original
+implementation, rebuilding the pixel grid and inverting K each call, and
+with the cached camera rays of carla.image_converter, checks that both give
+the same points and reports the clouds converted per second. Then times the
+PointCloud operations and the bird's-eye view rasterizer on a synthetic
+lidar sweep.
+
+    python -m benchmarks.point_cloud --width 800 --height 600 --repeat 50
+"""
+
+import argparse
+import math
+import time
+
+import numpy
+
+from carla import image_converter as ic
+from carla import sensor
+
+
+def legacy_depth_to_local_point_cloud(image, max_depth=0.9):
+    """The original implementation, kept as the baseline."""
+    far = 1000.0
+    normalized_depth = ic.depth_to_array(image)
+    k = numpy.identity(3)
+    k[0, 2] = image.width / 2.0
+    k[1, 2] = image.height / 2.0
+    k[0, 0] = k[1, 1] = image.width / \
+        (2.0 * math.tan(image.fov * math.pi / 360.0))
+    pixel_length = image.width * image.height
+    u_coord = numpy.tile(numpy.r_[image.width-1:-1:-1], (image.height, 1)).reshape(pixel_length)
+    v_coord = numpy.tile(numpy.c_[image.height-1:-1:-1], (1, image.width)).reshape(pixel_length)
+    normalized_depth = numpy.reshape(normalized_depth, pixel_length)
+    max_depth_indexes = numpy.where(normalized_depth > max_depth)
+    normalized_depth = numpy.delete(normalized_depth, max_depth_indexes)
+    u_coord = numpy.delete(u_coord, max_depth_indexes)
+    v_coord = numpy.delete(v_coord, max_depth_indexes)
+    p2d = numpy.array([u_coord, v_coord, numpy.ones_like(u_coord)])
+    p3d = numpy.dot(numpy.linalg.inv(k), p2d)
+    p3d *= normalized_depth * far
+    return sensor.PointCloud(image.frame_number, numpy.transpose(p3d))
+
+
+def make_depth_image(width, height, fov=90.0):
+    """Depth frame of a ground plane with the sky beyond max_depth."""
+    depth = numpy.empty((height, width), dtype=numpy.float64)
+    depth[:height // 2] = 1.0
+    rows = numpy.arange(height - height // 2, dtype=numpy.float64) + 1.0
+    depth[height // 2:] = numpy.minimum(0.2 * height / rows, 1.0)[:, numpy.newaxis] / 1000.0
+    encoded = numpy.round(depth * 16777215.0).astype(numpy.uint32)
+    array = numpy.empty((height, width, 4), dtype=numpy.uint8)
+    array[:, :, 2] = encoded & 0xff
+    array[:, :, 1] = (encoded >> 8) & 0xff
+    array[:, :, 0] = (encoded >> 16) & 0xff
+    array[:, :, 3] = 255
+    return sensor.Image(0, width, height, 'Depth', fov, array.tobytes())
+
+
+def make_lidar_cloud(point_count):
+    """Lidar sweep of point_count points around the sensor, z up."""
+    angles = numpy.random.uniform(-math.pi, math.pi, point_count)
+    distances = numpy.random.uniform(2.0, 50.0, point_count)
+    points = numpy.stack([
+        distances * numpy.cos(angles),
+        distances * numpy.sin(angles),
+        numpy.random.uniform(-2.4, 3.0, point_count)], axis=1)
+    return sensor.PointCloud(0, points.astype(numpy.float32))
+
+
+def _time(function, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        function()
+    return repeat / (time.perf_counter() - start)
+
+
+def main():
+    argparser = argparse.ArgumentParser(description=__doc__)
+    argparser.add_argument('--width', default=800, type=int)
+    argparser.add_argument('--height', default=600, type=int)
+    argparser.add_argument('--repeat', default=50, type=int)
+    argparser.add_argument('--lidar-points', default=56000, type=int)
+    args = argparser.parse_args()
+
+    image = make_depth_image(args.width, args.height)
+    legacy = legacy_depth_to_local_point_cloud(image)
+    current = ic.depth_to_local_point_cloud(image)
+    assert numpy.allclose(legacy.array, current.array, rtol=1e-5, atol=1e-3)
+
+    print('%d points per cloud' % len(current.array))
+    print('%-28s %12s' % ('conversion', 'clouds/s'))
+    print('%-28s %12.1f' % (
+        'legacy point cloud',
+        _time(lambda: legacy_depth_to_local_point_cloud(image), args.repeat)))
+    print('%-28s %12.1f' % (
+        'cached rays point cloud',
+        _time(lambda: ic.depth_to_local_point_cloud(image), args.repeat)))
+
+    cloud = make_lidar_cloud(args.lidar_points)
+    bev = numpy.empty((320, 320, 3), dtype=numpy.float32)
+    operations = [
+        ('crop_range', lambda: cloud.crop_range(30.0, 3.0)),
+        ('crop_box', lambda: cloud.crop_box((-20.0, -10.0, -2.0), (40.0, 10.0, 2.0))),
+        ('remove_ground', lambda: cloud.remove_ground(-2.0)),
+        ('voxel_downsample 0.2', lambda: cloud.voxel_downsample(0.2)),
+        ('merge 3 clouds', lambda: sensor.PointCloud.merge([cloud, cloud, cloud])),
+        ('bird\'s-eye view 320x320', lambda: ic.point_cloud_to_bev(cloud, out=bev))]
+    print()
+    print('%d lidar points' % args.lidar_points)
+    print('%-28s %12s' % ('operation', 'ms'))
+    for name, operation in operations:
+        print('%-28s %12.2f' % (name, 1000.0 / _time(operation, args.repeat)))
+
+
+if __name__ == '__main__':
+    main()
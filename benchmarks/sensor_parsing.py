@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+
+"""
+Micro-benchmark of the sensor message parsers.
+
+Parses camera and lidar messages with the original per-field lambdas and
+with the precompiled header structs of carla.client, from bytes and from
+zero-copy memoryviews, and reports the frames parsed per second.
+
+    python -m benchmarks.sensor_parsing --repeat 20000
+"""
+
+import argparse
+import struct
+import time
+
+import numpy
+
+from carla import client
+from carla import sensor
+
+
+def _legacy_parsers():
+    """The original lambda-based parsers, kept as the baseline."""
+    image_types = ['None', 'SceneFinal', 'Depth', 'SemanticSegmentation']
+    getimgtype = lambda id: image_types[id] if len(image_types) > id else 'Unknown'
+    getint32 = lambda data, index: struct.unpack('<L', data[index*4:index*4+4])[0]
+    getint64 = lambda data, index: struct.unpack('<Q', data[index*4:index*4+8])[0]
+    getfloat = lambda data, index: struct.unpack('<f', data[index*4:index*4+4])[0]
+
+    def parse_image(data):
+        frame_number = getint64(data, 0)
+        width = getint32(data, 2)
+        height = getint32(data, 3)
+        image_type = getimgtype(getint32(data, 4))
+        fov = getfloat(data, 5)
+        return sensor.Image(frame_number, width, height, image_type, fov, data[24:])
+
+    def parse_lidar(data):
+        frame_number = getint64(data, 0)
+        horizontal_angle = getfloat(data, 2)
+        channels = getint32(data, 3)
+        header_size = 16
+        point_count_by_channel = numpy.frombuffer(
+            data[header_size:header_size+channels*4],
+            dtype=numpy.dtype('uint32'))
+        points = numpy.frombuffer(
+            data[header_size+channels*4:],
+            dtype=numpy.dtype('f4'))
+        points = numpy.reshape(points, (int(points.shape[0]/3), 3))
+        return sensor.LidarMeasurement(
+            frame_number,
+            horizontal_angle,
+            channels,
+            point_count_by_channel,
+            sensor.PointCloud(frame_number, points))
+
+    return parse_image, parse_lidar
+
+
+def make_image_message(width, height):
+    header = struct.pack('<QLLLf', 1234, width, height, 1, 90.0)
+    return header + bytes(4 * width * height)
+
+
+def make_lidar_message(channels, points_per_channel):
+    header = struct.pack('<QfL', 1234, 12.5, channels)
+    counts = struct.pack('<%dL' % channels, *([points_per_channel] * channels))
+    points = numpy.random.uniform(-50.0, 50.0, (channels * points_per_channel, 3))
+    return header + counts + points.astype(numpy.float32).tobytes()
+
+
+def _time(parse, data, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        parse(data)
+    return repeat / (time.perf_counter() - start)
+
+
+def main():
+    argparser = argparse.ArgumentParser(description=__doc__)
+    argparser.add_argument('--repeat', default=20000, type=int)
+    args = argparser.parse_args()
+
+    legacy_image, legacy_lidar = _legacy_parsers()
+    messages = [
+        ('image 300x180', make_image_message(300, 180), legacy_image, client._parse_image),
+        ('image 1024x768', make_image_message(1024, 768), legacy_image, client._parse_image),
+        ('lidar 32x1500', make_lidar_message(32, 1500), legacy_lidar, client._parse_lidar)]
+
+    print('%-16s %-12s %14s %14s' % ('message', 'buffer', 'legacy (f/s)', 'struct (f/s)'))
+    for name, message, legacy, parse in messages:
+        for buffer_name, data in (('bytes', message), ('memoryview', memoryview(message))):
+            old, new = legacy(data), parse(data)
+            assert (old.frame_number, type(old)) == (new.frame_number, type(new))
+            print('%-16s %-12s %14.0f %14.0f' % (
+                name,
+                buffer_name,
+                _time(legacy, data, args.repeat),
+                _time(parse, data, args.repeat)))
+
+
+if __name__ == '__main__':
+    main()
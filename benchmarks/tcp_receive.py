@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+
+"""
+Micro-benchmark of the TCPClient receive path.
+
+Streams length-prefixed camera-sized frames from a local socket and measures
+the receive throughput and the memory allocated per frame of the legacy
+"buf += data" reader, the default bytearray reader and the zero-copy reader.
+Each frame is sliced past its image header, like CarlaClient does to build
+the raw_data of an Image: the bytearray reader copies the pixels there, the
+zero-copy reader does not.
+
+    python -m benchmarks.tcp_receive --width 1024 --height 768 --frames 200
+"""
+
+import argparse
+import socket
+import struct
+import threading
+import time
+import tracemalloc
+
+from carla import tcp
+
+
+# Frame, width, height, type and fov of a camera message.
+_IMAGE_HEADER_SIZE = 24
+
+
+class LegacyTCPClient(tcp.TCPClient):
+    """TCPClient with the original receive loop, kept as the baseline."""
+
+    def _read_n(self, length):
+        if self._socket is None:
+            raise tcp.TCPConnectionError(self._logprefix + 'not connected')
+        buf = bytes()
+        while length > 0:
+            data = self._socket.recv(length)
+            if not data:
+                raise tcp.TCPConnectionError(self._logprefix + 'connection closed')
+            buf += data
+            length -= len(data)
+        return buf
+
+
+def _serve(listener, message, count):
+    connection, _ = listener.accept()
+    with connection:
+        packet = struct.pack('<L', len(message)) + message
+        for _ in range(count):
+            connection.sendall(packet)
+
+
+def _run(client_type, message, count, trace, **kwargs):
+    listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    listener.bind(('localhost', 0))
+    listener.listen(1)
+    port = listener.getsockname()[1]
+    server = threading.Thread(target=_serve, args=(listener, message, count))
+    server.start()
+    client = client_type('localhost', port, 10, **kwargs)
+    client.connect()
+    peak = 0
+    try:
+        start = time.perf_counter()
+        for _ in range(count):
+            if trace:
+                tracemalloc.start()
+            data = client.read()[_IMAGE_HEADER_SIZE:]
+            if trace:
+                peak += tracemalloc.get_traced_memory()[1]
+                tracemalloc.stop()
+            del data
+        elapsed = time.perf_counter() - start
+    finally:
+        client.disconnect()
+        server.join()
+        listener.close()
+    return elapsed, peak / count
+
+
+def main():
+    argparser = argparse.ArgumentParser(description=__doc__)
+    argparser.add_argument('--width', default=1024, type=int)
+    argparser.add_argument('--height', default=768, type=int)
+    argparser.add_argument('--frames', default=200, type=int)
+    args = argparser.parse_args()
+
+    message = bytes(4 * args.width * args.height)
+    size_mb = len(message) / 1e6
+    readers = [
+        ('legacy', LegacyTCPClient, {}),
+        ('bytearray', tcp.TCPClient, {}),
+        ('zero-copy', tcp.TCPClient, {'zero_copy': True})]
+
+    print('frame size: %.2f MB, %d frames' % (size_mb, args.frames))
+    print('%-10s %12s %22s' % ('reader', 'MB/s', 'allocated MB/frame'))
+    for name, client_type, kwargs in readers:
+        elapsed, _ = _run(client_type, message, args.frames, False, **kwargs)
+        _, allocated = _run(client_type, message, min(args.frames, 20), True, **kwargs)
+        print('%-10s %12.1f %22.2f' % (
+            name, size_mb * args.frames / elapsed, allocated / 1e6))
+
+
+if __name__ == '__main__':
+    main()
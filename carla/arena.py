@@ -0,0 +1,146 @@
+# Copyright (c) 2017 Computer Vision Center (CVC) at the Universitat Autonoma de
+# Barcelona (UAB).
+#
+# This work is licensed under the terms of the MIT license.
+# For a copy, see <https://opensource.org/licenses/MIT>.
+
+"""Reusable per-sensor frame buffers."""
+
+import logging
+
+
+class FrameArenaError(Exception):
+    pass
+
+
+class FrameBuffer(object):
+    """
+    A reference counted receive buffer owned by a FrameArena.
+
+    The buffer is handed out acquired once. Every additional consumer that
+    keeps the data past the current frame must call "acquire", and every
+    consumer must call "release" when done. Once the count drops to zero the
+    buffer goes back to its pool and its contents will be overwritten.
+
+    Every time the buffer is handed out for a new frame its "generation" is
+    incremented, data parsed from an earlier frame checks its generation
+    to detect that the buffer was recycled.
+    """
+
+    def __init__(self, pool, capacity, debug):
+        self._pool = pool
+        self._debug = debug
+        self._buffer = bytearray(capacity)
+        self._length = 0
+        self._refcount = 0
+        self._generation = 0
+
+    @property
+    def capacity(self):
+        return len(self._buffer)
+
+    @property
+    def in_use(self):
+        return self._refcount > 0
+
+    @property
+    def generation(self):
+        """Number of frames this buffer was handed out for."""
+        return self._generation
+
+    @property
+    def view(self):
+        """Writable memoryview over the valid bytes of this buffer."""
+        self.check()
+        return memoryview(self._buffer)[:self._length]
+
+    def acquire(self, generation=None):
+        """Add a consumer to this buffer."""
+        self.check(generation)
+        self._refcount += 1
+        return self
+
+    def release(self, generation=None):
+        """Remove a consumer, recycle the buffer if it was the last one."""
+        self.check_generation(generation)
+        if self._refcount <= 0:
+            raise FrameArenaError('frame buffer released more times than acquired')
+        self._refcount -= 1
+        if self._refcount == 0:
+            if self._debug:
+                # Poison the contents so stale views read garbage.
+                self._buffer[:self._length] = b'\xdd' * self._length
+            if self._pool is not None:
+                self._pool.append(self)
+
+    def check(self, generation=None):
+        """
+        In debug mode, raise FrameArenaError if the buffer was released, or
+        if it was recycled since "generation" when given.
+        """
+        if self._debug and self._refcount <= 0:
+            raise FrameArenaError('use of a frame buffer after release')
+        self.check_generation(generation)
+
+    def check_generation(self, generation):
+        """In debug mode, raise FrameArenaError if the buffer was recycled."""
+        if self._debug and generation is not None and generation != self._generation:
+            raise FrameArenaError('use of a frame buffer after release, it now holds a later frame')
+
+    def _grow(self, capacity):
+        if capacity > len(self._buffer):
+            self._buffer = bytearray(capacity)
+
+    def _reset(self, length):
+        self._grow(length)
+        self._length = length
+        self._refcount = 1
+        self._generation += 1
+        return self
+
+
+class FrameArena(object):
+    """
+    Keeps a fixed pool of receive buffers per sensor id so that reading a
+    frame does not allocate. If every buffer of a sensor is still in use a
+    temporary buffer is allocated, and dropped once released.
+
+    With debug set, released buffers are poisoned and any access to the data
+    of a released frame through its SensorData raises FrameArenaError, even
+    once its buffer was handed out again for a later frame.
+    """
+
+    def __init__(self, pool_size=3, debug=False):
+        self.pool_size = max(1, pool_size)
+        self.debug = debug
+        self._pools = {}
+        self._counts = {}
+
+    def reserve(self, sensor_id, capacity):
+        """Preallocate the buffers of the given sensor."""
+        pool = self._pools.setdefault(sensor_id, [])
+        for buffer in pool:
+            buffer._grow(capacity)
+        count = self._counts.get(sensor_id, 0)
+        while count < self.pool_size:
+            pool.append(FrameBuffer(pool, capacity, self.debug))
+            count += 1
+        self._counts[sensor_id] = count
+
+    def clear(self):
+        """Drop every pooled buffer. Buffers in use are not recycled."""
+        for pool in self._pools.values():
+            del pool[:]
+        self._pools = {}
+        self._counts = {}
+
+    def acquire(self, sensor_id, length):
+        """Return a buffer of the given length, acquired once."""
+        pool = self._pools.get(sensor_id)
+        if pool is None:
+            self.reserve(sensor_id, length)
+            pool = self._pools[sensor_id]
+        if pool:
+            return pool.pop()._reset(length)
+        logging.debug('frame arena exhausted for sensor %d, allocating', sensor_id)
+        return FrameBuffer(None, length, self.debug)._reset(length)
@@ -0,0 +1,311 @@
+# Copyright (c) 2017 Computer Vision Center (CVC) at the Universitat Autonoma de
+# Barcelona (UAB).
+#
+# This work is licensed under the terms of the MIT license.
+# For a copy, see <https://opensource.org/licenses/MIT>.
+
+"""CARLA Client built on asyncio (Python 3.5+)."""
+
+import asyncio
+import collections
+import logging
+import struct
+
+from .client import VehicleControl, _make_sensor_parsers, carla_protocol
+from .tcp import TCPConnectionError
+
+
+def make_async_carla_client(host, world_port, timeout=15):
+    """
+    Create an AsyncCarlaClient to be used as an asynchronous context manager,
+    connecting on enter and disconnecting on exit.
+
+        async with make_async_carla_client('localhost', 2000) as client:
+            ...
+    """
+    return AsyncCarlaClient(host, world_port, timeout)
+
+
+# Messages received but not yet read above which the socket stops being read.
+_MAX_QUEUED_MESSAGES = 64
+
+
+class _MessageProtocol(getattr(asyncio, 'BufferedProtocol', asyncio.Protocol)):
+    """
+    Splits the incoming byte stream in length-prefixed messages. Each message
+    is received into a bytearray allocated to its size, directly from the
+    socket on Python 3.7+ (BufferedProtocol) and with a single copy per chunk
+    otherwise. Unlike asyncio.StreamReader, no intermediate buffer is
+    involved.
+    """
+
+    def __init__(self):
+        self._transport = None
+        self._messages = collections.deque()
+        self._waiter = None
+        self._exception = None
+        self._paused = False
+        self._header = bytearray(4)
+        self._buffer = self._header
+        self._offset = 0
+
+    def connection_made(self, transport):
+        self._transport = transport
+
+    def connection_lost(self, exception):
+        self._exception = exception or ConnectionError('connection closed')
+        self._wakeup()
+
+    def get_buffer(self, sizehint):
+        return memoryview(self._buffer)[self._offset:]
+
+    def buffer_updated(self, nbytes):
+        self._offset += nbytes
+        if self._offset == len(self._buffer):
+            self._complete()
+
+    def data_received(self, data):
+        view = memoryview(data)
+        while view:
+            count = min(len(view), len(self._buffer) - self._offset)
+            self._buffer[self._offset:self._offset + count] = view[:count]
+            view = view[count:]
+            self.buffer_updated(count)
+
+    def _complete(self):
+        if self._buffer is self._header:
+            length = struct.unpack('<L', self._header)[0]
+            if length > 0:
+                self._buffer = bytearray(length)
+                self._offset = 0
+                return
+            self._messages.append(memoryview(bytearray()))
+        else:
+            self._messages.append(memoryview(self._buffer))
+        self._buffer = self._header
+        self._offset = 0
+        if len(self._messages) > _MAX_QUEUED_MESSAGES and not self._paused:
+            self._transport.pause_reading()
+            self._paused = True
+        self._wakeup()
+
+    def _wakeup(self):
+        if self._waiter is not None and not self._waiter.done():
+            self._waiter.set_result(None)
+
+    async def read(self):
+        while not self._messages:
+            if self._exception is not None:
+                raise self._exception
+            self._waiter = asyncio.get_event_loop().create_future()
+            try:
+                await self._waiter
+            finally:
+                self._waiter = None
+        if self._paused and len(self._messages) <= _MAX_QUEUED_MESSAGES // 2:
+            self._transport.resume_reading()
+            self._paused = False
+        return self._messages.popleft()
+
+
+class AsyncTCPClient(object):
+    """
+    asyncio counterpart of tcp.TCPClient. Errors occurred during networking
+    operations are raised as TCPConnectionError.
+
+    Messages are returned as memoryviews, like tcp.TCPClient in zero-copy
+    mode.
+    """
+
+    def __init__(self, host, port, timeout):
+        self._host = host
+        self._port = port
+        self._timeout = timeout
+        self._transport = None
+        self._protocol = None
+        self._logprefix = '(%s:%s) ' % (self._host, self._port)
+
+    async def connect(self, connection_attempts=10):
+        """Try to establish a connection to the given host:port."""
+        connection_attempts = max(1, connection_attempts)
+        error = None
+        loop = asyncio.get_event_loop()
+        for attempt in range(1, connection_attempts + 1):
+            try:
+                self._transport, self._protocol = await asyncio.wait_for(
+                    loop.create_connection(_MessageProtocol, self._host, self._port),
+                    self._timeout)
+                logging.debug('%sconnected', self._logprefix)
+                return
+            except (OSError, asyncio.TimeoutError) as exception:
+                error = exception
+                logging.debug('%sconnection attempt %d: %s', self._logprefix, attempt, error)
+                await asyncio.sleep(1)
+        self._reraise_exception_as_tcp_error('failed to connect', error)
+
+    def disconnect(self):
+        """Disconnect any active connection."""
+        if self._transport is not None:
+            logging.debug('%sdisconnecting', self._logprefix)
+            self._transport.close()
+            self._transport = None
+            self._protocol = None
+
+    def connected(self):
+        """Return whether there is an active connection."""
+        return self._transport is not None
+
+    async def write(self, message):
+        """Send message to the server."""
+        if self._transport is None or self._transport.is_closing():
+            raise TCPConnectionError(self._logprefix + 'not connected')
+        self._transport.write(struct.pack('<L', len(message)) + message)
+
+    async def read(self):
+        """Read a message from the server."""
+        if self._protocol is None:
+            raise TCPConnectionError(self._logprefix + 'not connected')
+        try:
+            return await asyncio.wait_for(self._protocol.read(), self._timeout)
+        except (OSError, asyncio.TimeoutError) as exception:
+            self._reraise_exception_as_tcp_error('failed to read data', exception)
+
+    def _reraise_exception_as_tcp_error(self, message, exception):
+        raise TCPConnectionError('%s%s: %s' % (self._logprefix, message, exception))
+
+
+class AsyncCarlaClient(object):
+    """
+    The CARLA client on asyncio streams. Same interface as
+    client.CarlaClient, with every networking method being a coroutine, so
+    other coroutines (rendering, inference, disk I/O) run while the client
+    waits on the server.
+    """
+
+    def __init__(self, host, world_port, timeout=15):
+        self._world_client = AsyncTCPClient(host, world_port, timeout)
+        self._stream_client = AsyncTCPClient(host, world_port + 1, timeout)
+        self._control_client = AsyncTCPClient(host, world_port + 2, timeout)
+        self._current_settings = None
+        self._is_episode_requested = False
+        self._sensors = {}
+
+    async def __aenter__(self):
+        await self.connect()
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        self.disconnect()
+
+    async def connect(self, connection_attempts=10):
+        """
+        Try to establish a connection to a CARLA server at the given host:port.
+        """
+        await self._world_client.connect(connection_attempts)
+
+    def disconnect(self):
+        """Disconnect from server."""
+        self._control_client.disconnect()
+        self._stream_client.disconnect()
+        self._world_client.disconnect()
+
+    def connected(self):
+        """Return whether there is an active connection."""
+        return self._world_client.connected()
+
+    async def load_settings(self, carla_settings):
+        """
+        Load new settings and request a new episode based on these settings.
+        Return a protobuf object holding the scene description.
+        """
+        self._current_settings = carla_settings
+        return await self._request_new_episode(carla_settings)
+
+    async def start_episode(self, player_start_index):
+        """
+        Start the new episode at the player start given by the
+        player_start_index, waits until the server answers with an
+        EpisodeReady.
+        """
+        if self._current_settings is None:
+            raise RuntimeError('no settings loaded, cannot start episode')
+
+        # if no new settings are loaded, request new episode with previous
+        if not self._is_episode_requested:
+            await self._request_new_episode(self._current_settings)
+
+        try:
+            pb_message = carla_protocol.EpisodeStart()
+            pb_message.player_start_spot_index = player_start_index
+            await self._world_client.write(pb_message.SerializeToString())
+            # Wait for EpisodeReady.
+            data = await self._world_client.read()
+            if not data:
+                raise RuntimeError('failed to read data from server')
+            pb_message = carla_protocol.EpisodeReady()
+            pb_message.ParseFromString(bytes(data))
+            if not pb_message.ready:
+                raise RuntimeError('cannot start episode: server failed to start episode')
+            # We can start the agent clients now.
+            await asyncio.gather(
+                self._stream_client.connect(),
+                self._control_client.connect())
+        finally:
+            self._is_episode_requested = False
+
+    async def read_data(self):
+        """
+        Read the data sent from the server this frame. Return a pair
+        containing the protobuf object containing the measurements followed
+        by the raw data of the sensors.
+        """
+        data = await self._stream_client.read()
+        if not data:
+            raise RuntimeError('failed to read data from server')
+        pb_message = carla_protocol.Measurements()
+        pb_message.ParseFromString(bytes(data))
+        sensor_data = {}
+        while True:
+            data = await self._stream_client.read()
+            if not data:
+                break
+            name, parsed = self._parse_sensor_data(data)
+            sensor_data[name] = parsed
+        return pb_message, sensor_data
+
+    async def send_control(self, *args, **kwargs):
+        """Send the VehicleControl to be applied this frame."""
+        if isinstance(args[0] if args else None, VehicleControl):
+            pb_message = args[0]
+        else:
+            pb_message = VehicleControl()
+            pb_message.steer = kwargs.get('steer', 0.0)
+            pb_message.throttle = kwargs.get('throttle', 0.0)
+            pb_message.brake = kwargs.get('brake', 0.0)
+            pb_message.hand_brake = kwargs.get('hand_brake', False)
+            pb_message.reverse = kwargs.get('reverse', False)
+        await self._control_client.write(pb_message.SerializeToString())
+
+    async def _request_new_episode(self, carla_settings):
+        # Disconnect agent clients.
+        self._stream_client.disconnect()
+        self._control_client.disconnect()
+        # Send new episode request.
+        pb_message = carla_protocol.RequestNewEpisode()
+        pb_message.ini_file = str(carla_settings)
+        await self._world_client.write(pb_message.SerializeToString())
+        # Read scene description.
+        data = await self._world_client.read()
+        if not data:
+            raise RuntimeError('failed to read data from server')
+        pb_message = carla_protocol.SceneDescription()
+        pb_message.ParseFromString(bytes(data))
+        self._sensors = dict((sensor.id, sensor) \
+            for sensor in _make_sensor_parsers(pb_message.sensors))
+        self._is_episode_requested = True
+        return pb_message
+
+    def _parse_sensor_data(self, data):
+        sensor_id = struct.unpack_from('<L', data)[0]
+        parser = self._sensors[sensor_id]
+        return parser.name, parser.parse_raw_data(data[4:])
@@ -0,0 +1,63 @@
+# Copyright (c) 2017 Computer Vision Center (CVC) at the Universitat Autonoma de
+# Barcelona (UAB).
+#
+# This work is licensed under the terms of the MIT license.
+# For a copy, see <https://opensource.org/licenses/MIT>.
+
+"""
+Capture of the raw CARLA stream.
+
+A capture is an append-only file holding every message received on the
+stream port, length prefix included, exactly as sent by the server. The
+SceneDescription of each episode is stored before its frames, since the
+sensor definitions are needed to parse them. A second file, the capture path
+plus ".idx", indexes the records with a (offset, kind) pair of uint64 each.
+
+Captures are written by CarlaClient.start_capture and played back by
+replay.ReplayCarlaClient.
+"""
+
+import struct
+
+MAGIC = b'CARLACAP'
+VERSION = 1
+HEADER = struct.Struct('<8sL')
+
+INDEX_ENTRY = struct.Struct('<QQ')
+RECORD_FRAME = 0
+RECORD_SCENE = 1
+
+
+def index_path(path):
+    return str(path) + '.idx'
+
+
+class StreamCapture(object):
+    """Append-only writer of a capture file and its index."""
+
+    def __init__(self, path):
+        self._file = open(str(path), 'ab')
+        self._index = open(index_path(path), 'ab')
+        if self._file.tell() == 0:
+            self._file.write(HEADER.pack(MAGIC, VERSION))
+
+    def write_scene(self, data):
+        """Append a serialized SceneDescription."""
+        self._begin_record(RECORD_SCENE)
+        self._file.write(struct.pack('<L', len(data)))
+        self._file.write(data)
+
+    def begin_frame(self):
+        """Mark the start of a frame, the next messages written belong to it."""
+        self._begin_record(RECORD_FRAME)
+
+    def write(self, data):
+        """Append raw bytes received on the stream port."""
+        self._file.write(data)
+
+    def close(self):
+        self._file.close()
+        self._index.close()
+
+    def _begin_record(self, kind):
+        self._index.write(INDEX_ENTRY.pack(self._file.tell(), kind))
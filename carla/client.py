@@ -11,6 +11,8 @@ import struct
 
 from contextlib import contextmanager
 
+from . import capture
+from . import measurements
 from . import sensor
 from . import tcp
 from . import util
@@ -29,23 +31,57 @@ except ImportError:
 VehicleControl = carla_protocol.Control
 
 
+_ARENA_SENSOR_TYPES = (carla_protocol.Sensor.CAMERA, carla_protocol.Sensor.LIDAR_RAY_CAST)
+
+
 @contextmanager
-def make_carla_client(host, world_port, timeout=15):
-    """Context manager for creating and connecting a CarlaClient."""
-    with util.make_connection(CarlaClient, host, world_port, timeout) as client:
+def make_carla_client(host, world_port, timeout=15, **kwargs):
+    """
+    Context manager for creating and connecting a CarlaClient. Keyword
+    arguments are forwarded to CarlaClient.
+    """
+    with util.make_connection(CarlaClient, host, world_port, timeout, **kwargs) as client:
         yield client
 
 
 class CarlaClient(object):
-    """The CARLA client. Manages communications with the CARLA server."""
+    """
+    The CARLA client. Manages communications with the CARLA server.
+
+    If zero_copy is set, sensor data is received without intermediate copies;
+    the raw_data of the images returned by "read_data" are then memoryviews
+    over the received message, instead of a bytearray copied out of it.
+
+    If a carla.arena.FrameArena is given, sensor data is received into its
+    pooled buffers instead. Each SensorData returned by "read_data" is then
+    acquired once and must be released by the caller (see SensorData).
+
+    If lazy_measurements is set, "read_data" returns a
+    measurements.LazyMeasurements that only decodes the non_player_agents
+    when they are accessed.
+
+    Sensors can be marked inactive with "set_sensor_active"; their data is
+    then drained from the socket without being parsed and left out of
+    "read_data".
 
-    def __init__(self, host, world_port, timeout=15):
+    "start_capture" records the stream of the server to a file that can be
+    played back without simulator by replay.ReplayCarlaClient.
+    """
+
+    def __init__(self, host, world_port, timeout=15, zero_copy=False, frame_arena=None,
+                 lazy_measurements=False):
         self._world_client = tcp.TCPClient(host, world_port, timeout)
-        self._stream_client = tcp.TCPClient(host, world_port + 1, timeout)
+        self._stream_client = tcp.TCPClient(host, world_port + 1, timeout, zero_copy)
         self._control_client = tcp.TCPClient(host, world_port + 2, timeout)
         self._current_settings = None
         self._is_episode_requested = False
         self._sensors = {}
+        self._frame_arena = frame_arena
+        self._lazy_measurements = lazy_measurements
+        self._sensor_id_buffer = bytearray(4)
+        self._scene_data = None
+        self._capture = None
+        self._inactive_sensors = set()
 
     def connect(self, connection_attempts=10):
         """
@@ -55,6 +91,7 @@ class CarlaClient(object):
 
     def disconnect(self):
         """Disconnect from server."""
+        self.stop_capture()
         self._control_client.disconnect()
         self._stream_client.disconnect()
         self._world_client.disconnect()
@@ -63,6 +100,39 @@ class CarlaClient(object):
         """Return whether there is an active connection."""
         return self._world_client.connected()
 
+    def set_sensor_active(self, sensor_name, active=True):
+        """
+        Subscribe to or unsubscribe from the data of the sensor named
+        sensor_name. Subscriptions are kept across episodes, the server keeps
+        sending the data of inactive sensors.
+        """
+        if active:
+            self._inactive_sensors.discard(sensor_name)
+        else:
+            self._inactive_sensors.add(sensor_name)
+
+    def is_sensor_active(self, sensor_name):
+        """Return whether the data of the sensor is returned by "read_data"."""
+        return sensor_name not in self._inactive_sensors
+
+    def start_capture(self, path):
+        """
+        Append the scene description and every frame read from now on to the
+        capture file at path (see carla.capture). Frames are captured raw, as
+        received from the server.
+        """
+        self.stop_capture()
+        self._capture = capture.StreamCapture(path)
+        if self._scene_data is not None:
+            self._capture.write_scene(self._scene_data)
+
+    def stop_capture(self):
+        """Stop capturing and close the capture file."""
+        if self._capture is not None:
+            self._stream_client.set_capture(None)
+            self._capture.close()
+            self._capture = None
+
     def load_settings(self, carla_settings):
         """
         Load new settings and request a new episode based on these settings.
@@ -117,12 +187,18 @@ class CarlaClient(object):
         started. Return a pair containing the protobuf object containing the
         measurements followed by the raw data of the sensors.
         """
+        if self._capture is not None:
+            self._capture.begin_frame()
+            self._stream_client.set_capture(self._capture)
         # Read measurements.
         data = self._stream_client.read()
         if not data:
             raise RuntimeError('failed to read data from server')
-        pb_message = carla_protocol.Measurements()
-        pb_message.ParseFromString(data)
+        if self._lazy_measurements:
+            pb_message = measurements.LazyMeasurements(data)
+        else:
+            pb_message = carla_protocol.Measurements()
+            pb_message.ParseFromString(data)
         # Read sensor data.
         return pb_message, dict(x for x in self._read_sensor_data())
 
@@ -162,71 +238,110 @@ class CarlaClient(object):
             raise RuntimeError('failed to read data from server')
         pb_message = carla_protocol.SceneDescription()
         pb_message.ParseFromString(data)
+        self._scene_data = data
+        if self._capture is not None:
+            self._capture.write_scene(data)
         self._sensors = dict((sensor.id, sensor) \
             for sensor in _make_sensor_parsers(pb_message.sensors))
+        if self._frame_arena is not None:
+            self._reserve_frame_buffers(carla_settings)
         self._is_episode_requested = True
         return pb_message
 
+    def _reserve_frame_buffers(self, carla_settings):
+        """Size the arena pools from the sensor definitions of the settings."""
+        self._frame_arena.clear()
+        get_sensors = getattr(carla_settings, 'get_sensors', list)
+        sizes = dict((s.SensorName, _get_frame_size(s)) for s in get_sensors())
+        for sensor_def in self._sensors.values():
+            size = sizes.get(sensor_def.name)
+            if size is not None:
+                self._frame_arena.reserve(sensor_def.id, size)
+
     def _read_sensor_data(self):
         while True:
-            data = self._stream_client.read()
-            if not data:
-                raise StopIteration
-            yield self._parse_sensor_data(data)
-
-    def _parse_sensor_data(self, data):
-        sensor_id = struct.unpack('<L', data[0:4])[0]
-        parser = self._sensors[sensor_id]
-        return parser.name, parser.parse_raw_data(data[4:])
+            length = self._stream_client.read_header()
+            if length == 0:
+                return
+            self._stream_client.read_into(self._sensor_id_buffer)
+            sensor_id = _SENSOR_ID.unpack_from(self._sensor_id_buffer)[0]
+            parser = self._sensors[sensor_id]
+            if parser.name in self._inactive_sensors:
+                self._stream_client.skip(length - 4)
+            elif self._frame_arena is None or parser.type not in _ARENA_SENSOR_TYPES:
+                # Sensor types without arena pool get a buffer of their own.
+                raw_data = self._stream_client.read_body(length - 4)
+                yield parser.name, parser.parse_raw_data(raw_data)
+            else:
+                yield parser.name, self._read_sensor_frame(parser, length - 4)
+
+    def _read_sensor_frame(self, parser, length):
+        """Read and parse the current sensor message into an arena buffer."""
+        buffer = self._frame_arena.acquire(parser.id, length)
+        self._stream_client.read_into(buffer.view)
+        data = parser.parse_raw_data(buffer.view)
+        data._attach_buffer(buffer)
+        return data
+
+
+def _get_frame_size(sensor_def):
+    """Size in bytes of a frame of the sensor, without the sensor id."""
+    if isinstance(sensor_def, sensor.Camera):
+        return 24 + 4 * sensor_def.ImageSizeX * sensor_def.ImageSizeY
+    # Lidar sweeps vary in size, their buffers grow on demand.
+    return None
+
+
+_IMAGE_TYPES = ['None', 'SceneFinal', 'Depth', 'SemanticSegmentation']
+
+# Header layouts of the sensor messages, after the sensor id.
+_SENSOR_ID = struct.Struct('<L')
+_IMAGE_HEADER = struct.Struct('<QLLLf')  # frame, width, height, type, fov
+_LIDAR_HEADER = struct.Struct('<QfL')  # frame, horizontal angle, channels
+
+
+def _parse_image(data):
+    frame_number, width, height, image_type, fov = _IMAGE_HEADER.unpack_from(data)
+    image_type = _IMAGE_TYPES[image_type] if image_type < len(_IMAGE_TYPES) else 'Unknown'
+    return sensor.Image(frame_number, width, height, image_type, fov, data[_IMAGE_HEADER.size:])
+
+
+def _parse_lidar(data):
+    frame_number, horizontal_angle, channels = _LIDAR_HEADER.unpack_from(data)
+    offset = _LIDAR_HEADER.size
+    point_count_by_channel = numpy.frombuffer(
+        data, dtype=numpy.dtype('uint32'), count=channels, offset=offset)
+    points = numpy.frombuffer(data, dtype=numpy.dtype('f4'), offset=offset + 4 * channels)
+    points = numpy.reshape(points, (-1, 3))
+    return sensor.LidarMeasurement(
+        frame_number,
+        horizontal_angle,
+        channels,
+        point_count_by_channel,
+        sensor.PointCloud(frame_number, points))
+
+
+def _parse_unknown(data):
+    return data
+
+
+_SENSOR_PARSERS = {
+    carla_protocol.Sensor.CAMERA: _parse_image,
+    carla_protocol.Sensor.LIDAR_RAY_CAST: _parse_lidar
+}
+
+
+class _SensorDefinition(object):
+    def __init__(self, s):
+        self.id = s.id
+        self.name = s.name
+        self.type = s.type
+        self.parse_raw_data = _SENSOR_PARSERS.get(s.type, _parse_unknown)
 
 
 def _make_sensor_parsers(sensors):
-    image_types = ['None', 'SceneFinal', 'Depth', 'SemanticSegmentation']
-    getimgtype = lambda id: image_types[id] if len(image_types) > id else 'Unknown'
-    getint32 = lambda data, index: struct.unpack('<L', data[index*4:index*4+4])[0]
-    getint64 = lambda data, index: struct.unpack('<Q', data[index*4:index*4+8])[0]
-    getfloat = lambda data, index: struct.unpack('<f', data[index*4:index*4+4])[0]
-
-    def parse_image(data):
-        frame_number = getint64(data, 0)
-        width = getint32(data, 2)
-        height = getint32(data, 3)
-        image_type = getimgtype(getint32(data, 4))
-        fov = getfloat(data, 5)
-        return sensor.Image(frame_number, width, height, image_type, fov, data[24:])
-
-    def parse_lidar(data):
-        frame_number = getint64(data, 0)
-        horizontal_angle = getfloat(data, 2)
-        channels = getint32(data, 3)
-        header_size = 16
-        point_count_by_channel = numpy.frombuffer(
-            data[header_size:header_size+channels*4],
-            dtype=numpy.dtype('uint32'))
-        points = numpy.frombuffer(
-            data[header_size+channels*4:],
-            dtype=numpy.dtype('f4'))
-        points = numpy.reshape(points, (int(points.shape[0]/3), 3))
-        return sensor.LidarMeasurement(
-            frame_number,
-            horizontal_angle,
-            channels,
-            point_count_by_channel,
-            sensor.PointCloud(frame_number, points))
-
-    class SensorDefinition(object):
-        def __init__(self, s):
-            self.id = s.id
-            self.name = s.name
-            self.type = s.type
-            self.parse_raw_data = lambda x: x
-
     for s in sensors:
-        sensor_def = SensorDefinition(s)
-        if sensor_def.type == carla_protocol.Sensor.CAMERA:
-            sensor_def.parse_raw_data = parse_image
-        elif sensor_def.type == carla_protocol.Sensor.LIDAR_RAY_CAST:
-            sensor_def.parse_raw_data = parse_lidar
-        else:
+        sensor_def = _SensorDefinition(s)
+        if sensor_def.type not in _SENSOR_PARSERS:
             logging.error('unknown sensor type %s', sensor_def.type)
         yield sensor_def
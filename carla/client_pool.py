@@ -0,0 +1,135 @@
+# Copyright (c) 2017 Computer Vision Center (CVC) at the Universitat Autonoma de
+# Barcelona (UAB).
+#
+# This work is licensed under the terms of the MIT license.
+# For a copy, see <https://opensource.org/licenses/MIT>.
+
+"""Pool of CARLA clients driving several servers from one process."""
+
+import concurrent.futures
+
+from contextlib import contextmanager
+
+from . import util
+from .client import CarlaClient
+
+
+@contextmanager
+def make_carla_client_pool(addresses, timeout=15, **kwargs):
+    """Context manager for creating and connecting a CarlaClientPool."""
+    with util.make_connection(CarlaClientPool, addresses, timeout, **kwargs) as pool:
+        yield pool
+
+
+class CarlaClientPool(object):
+    """
+    Manages one CarlaClient per (host, world_port) address. Every call runs
+    on all the clients concurrently, one worker thread per server, and
+    returns the results in the order of the addresses. Keyword arguments are
+    forwarded to each CarlaClient.
+
+    Arguments that differ per server (settings, player starts, controls) are
+    given as a list with one item per address; a single value is used for
+    every server.
+
+    A carla.arena.FrameArena is not thread-safe and is bound to the sensor
+    ids of one server, so arenas are given as "frame_arenas", a list with a
+    distinct arena per address, and not as a "frame_arena" shared by every
+    client.
+    """
+
+    def __init__(self, addresses, timeout=15, frame_arenas=None, **kwargs):
+        if 'frame_arena' in kwargs:
+            raise ValueError('the clients cannot share a frame_arena, give one per server in frame_arenas')
+        addresses = list(addresses)
+        if frame_arenas is None:
+            frame_arenas = [None] * len(addresses)
+        elif len(frame_arenas) != len(addresses):
+            raise ValueError(
+                'expected %d frame arenas, one per server, got %d' % (len(addresses), len(frame_arenas)))
+        self.clients = [
+            CarlaClient(host, port, timeout, frame_arena=frame_arena, **kwargs)
+            for (host, port), frame_arena in zip(addresses, frame_arenas)]
+        self._executor = None
+
+    def __len__(self):
+        return len(self.clients)
+
+    def connect(self, connection_attempts=10):
+        """Connect every client to its server."""
+        if self._executor is None:
+            self._executor = concurrent.futures.ThreadPoolExecutor(max_workers=len(self.clients))
+        self._run(lambda client: client.connect(connection_attempts))
+
+    def disconnect(self):
+        """Disconnect every client."""
+        for client in self.clients:
+            client.disconnect()
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+
+    def connected(self):
+        """Return whether every client is connected."""
+        return all(client.connected() for client in self.clients)
+
+    def load_settings(self, carla_settings):
+        """Load the settings on every server, return the scene descriptions."""
+        return self._run(
+            lambda client, settings: client.load_settings(settings),
+            self._per_client(carla_settings))
+
+    def start_episode(self, player_start_index):
+        """Start the episode of every server at the given player start."""
+        self._run(
+            lambda client, index: client.start_episode(index),
+            self._per_client(player_start_index))
+
+    def read_all(self):
+        """
+        Read the current frame of every server. Return a list of
+        (measurements, sensor_data) pairs.
+        """
+        return self._run(lambda client: client.read_data())
+
+    def send_all(self, controls):
+        """Send a VehicleControl to every server, None skips a server."""
+        self._run(_send_control, self._per_client(controls))
+
+    def step_all(self, controls=None):
+        """
+        Send the controls for the current frames, if any, then read the next
+        frame of every server. Return a list of (measurements, sensor_data)
+        pairs.
+        """
+        return self._run(_step, self._per_client(controls))
+
+    def _per_client(self, value):
+        if isinstance(value, (list, tuple)):
+            if len(value) != len(self.clients):
+                raise ValueError(
+                    'expected %d values, one per server, got %d' % (len(self.clients), len(value)))
+            return value
+        return [value] * len(self.clients)
+
+    def _run(self, function, arguments=None):
+        if self._executor is None:
+            raise RuntimeError('client pool is not connected')
+        if arguments is None:
+            futures = [self._executor.submit(function, client) for client in self.clients]
+        else:
+            futures = [self._executor.submit(function, client, argument)
+                       for client, argument in zip(self.clients, arguments)]
+        # Let every server finish before raising the first error.
+        concurrent.futures.wait(futures)
+        return [future.result() for future in futures]
+
+
+def _send_control(client, control):
+    if control is not None:
+        client.send_control(control)
+
+
+def _step(client, control):
+    _send_control(client, control)
+    return client.read_data()
@@ -274,7 +274,9 @@ def run_driving_benchmark(agent,
     while True:
         try:
 
-            with make_carla_client(host, port) as client:
+            # Only the player measurements are needed by the benchmark, the
+            # non-player agents are decoded if the agent asks for them.
+            with make_carla_client(host, port, lazy_measurements=True) as client:
                 # Hack to fix for the issue 310, we force a reset, so it does not get
                 #  the positions on first server reset.
                 client.load_settings(CarlaSettings())
@@ -13,11 +13,11 @@ them afterwards with the C++ implementation at "Util/ImageConverter" as it
 provides considerably better performance.
 """
 
+import functools
 import math
 
 try:
     import numpy
-    from numpy.matlib import repmat
 except ImportError:
     raise RuntimeError('cannot import numpy, make sure numpy package is installed')
 
@@ -25,6 +25,26 @@ except ImportError:
 from . import sensor
 
 
+# Cityscapes color of each CARLA semantic segmentation label, unknown labels
+# are black.
+CITYSCAPES_PALETTE = numpy.zeros((256, 3), dtype=numpy.uint8)
+CITYSCAPES_PALETTE[:13] = [
+    [0, 0, 0],         # None
+    [70, 70, 70],      # Buildings
+    [190, 153, 153],   # Fences
+    [72, 0, 90],       # Other
+    [220, 20, 60],     # Pedestrians
+    [153, 153, 153],   # Poles
+    [157, 234, 50],    # RoadLines
+    [128, 64, 128],    # Roads
+    [244, 35, 232],    # Sidewalks
+    [107, 142, 35],    # Vegetation
+    [0, 0, 255],       # Vehicles
+    [102, 102, 156],   # Walls
+    [220, 220, 0]      # TrafficSigns
+]
+
+
 def to_bgra_array(image):
     """Convert a CARLA raw image to a BGRA numpy array."""
     if not isinstance(image, sensor.Image):
@@ -48,47 +68,25 @@ def labels_to_array(image):
     Convert an image containing CARLA semantic segmentation labels to a 2D array
     containing the label of each pixel.
     """
-    return to_bgra_array(image)[:, :, 2]
+    return _labels(to_bgra_array(image))
 
 
-def labels_to_cityscapes_palette(image):
+def labels_to_cityscapes_palette(image, out=None):
     """
     Convert an image containing CARLA semantic segmentation labels to
-    Cityscapes palette.
-    """
-    classes = {
-        0: [0, 0, 0],         # None
-        1: [70, 70, 70],      # Buildings
-        2: [190, 153, 153],   # Fences
-        3: [72, 0, 90],       # Other
-        4: [220, 20, 60],     # Pedestrians
-        5: [153, 153, 153],   # Poles
-        6: [157, 234, 50],    # RoadLines
-        7: [128, 64, 128],    # Roads
-        8: [244, 35, 232],    # Sidewalks
-        9: [107, 142, 35],    # Vegetation
-        10: [0, 0, 255],      # Vehicles
-        11: [102, 102, 156],  # Walls
-        12: [220, 220, 0]     # TrafficSigns
-    }
-    array = labels_to_array(image)
-    result = numpy.zeros((array.shape[0], array.shape[1], 3))
-    for key, value in classes.items():
-        result[numpy.where(array == key)] = value
-    return result
-
-
-def depth_to_array(image):
+    Cityscapes palette. Return a (height, width, 3) uint8 array, written to
+    "out" if given.
     """
-    Convert an image containing CARLA encoded depth-map to a 2D array containing
-    the depth value of each pixel normalized between [0.0, 1.0].
+    return label_array_to_cityscapes_palette(to_bgra_array(image)[..., 2], out)
+
+
+def depth_to_array(image, out=None):
     """
-    array = to_bgra_array(image)
-    array = array.astype(numpy.float32)
-    # Apply (R + G * 256 + B * 256 * 256) / (256 * 256 * 256 - 1).
-    normalized_depth = numpy.dot(array[:, :, :3], [65536.0, 256.0, 1.0])
-    normalized_depth /= 16777215.0  # (256.0 * 256.0 * 256.0 - 1.0)
-    return normalized_depth
+    Convert an image containing CARLA encoded depth-map to a 2D float32 array
+    containing the depth value of each pixel normalized between [0.0, 1.0],
+    written to "out" if given.
+    """
+    return _decode_depth(to_bgra_array(image), out)
 
 
 def depth_to_logarithmic_grayscale(image):
@@ -107,56 +105,248 @@ def depth_to_logarithmic_grayscale(image):
     return numpy.repeat(logdepth[:, :, numpy.newaxis], 3, axis=2)
 
 
+def depth_to_logarithmic_uint8(image, out=None, channels=1, work=None):
+    """
+    Convert an image containing CARLA encoded depth-map to a logarithmic
+    grayscale uint8 image, the rounded values of
+    "depth_to_logarithmic_grayscale". Return a (height, width) array, or
+    (height, width, channels) if channels is not 1, written to "out" if given.
+    "work" is an optional (height, width) float32 scratch buffer.
+    """
+    return _logarithmic_uint8(_decode_depth(to_bgra_array(image), work), out, channels)
+
+
+def depth_to_packed_array(image, out=None):
+    """
+    Copy the 24-bit encoded depth of an image containing CARLA encoded
+    depth-map to a compact (height, width, 3) uint8 array of its B, G and R
+    bytes, written to "out" if given. See "packed_depth_to_logarithmic_uint8".
+    """
+    bgra = to_bgra_array(image)
+    if out is None:
+        out = numpy.empty(bgra.shape[:2] + (3,), dtype=numpy.uint8)
+    numpy.copyto(out, bgra[:, :, :3])
+    return out
+
+
+def packed_depth_to_logarithmic_uint8(packed, out=None, channels=1):
+    """
+    Same as "depth_to_logarithmic_uint8" for a depth-map copied with
+    "depth_to_packed_array".
+    """
+    bgra = numpy.zeros(packed.shape[:2] + (4,), dtype=numpy.uint8)
+    bgra[:, :, :3] = packed
+    return _logarithmic_uint8(_decode_depth(bgra), out, channels)
+
+
+def label_array_to_cityscapes_palette(labels, out=None):
+    """
+    Convert a 2D array of semantic segmentation labels, see "labels_to_array",
+    to a (height, width, 3) uint8 array in Cityscapes palette, written to
+    "out" if given.
+    """
+    return numpy.take(CITYSCAPES_PALETTE, labels, axis=0, out=out)
+
+
+def to_bgra_batch(images, out=None):
+    """
+    Stack a list of same-shaped CARLA raw images into a (N, height, width, 4)
+    BGRA array, written to "out" if given. An already stacked uint8 array is
+    returned as is, or copied to "out".
+    """
+    if isinstance(images, numpy.ndarray):
+        images = _check_bgra_batch(images)
+        if out is None:
+            return images
+        numpy.copyto(out, images)
+        return out
+    if out is None:
+        out = numpy.empty(_batch_shape(images) + (4,), dtype=numpy.uint8)
+    for index, image in enumerate(images):
+        out[index] = to_bgra_array(image)
+    return out
+
+
+def labels_batch(images, out=None):
+    """
+    Convert a list of same-shaped semantic segmentation images, or their
+    stacked (N, height, width, 4) BGRA array, to a (N, height, width) uint8
+    array of labels, written to "out" if given. The labels of the whole stack
+    are read at once.
+    """
+    return _labels(to_bgra_batch(images), out)
+
+
+def palette_batch(images, out=None):
+    """
+    Convert a list of same-shaped semantic segmentation images, or their
+    stacked (N, height, width, 4) BGRA array, to a (N, height, width, 3)
+    uint8 array in Cityscapes palette, written to "out" if given.
+    """
+    return label_array_to_cityscapes_palette(labels_batch(images), out)
+
+
+def depth_batch(images, out=None):
+    """
+    Convert a list of same-shaped depth images, or their stacked
+    (N, height, width, 4) BGRA array, to a (N, height, width) float32 array
+    of depths normalized between [0.0, 1.0], written to "out" if given. The
+    whole stack is decoded in a single pass.
+    """
+    return _decode_depth(to_bgra_batch(images), out)
+
+
+def _batch_shape(images):
+    if not images:
+        raise ValueError("Cannot convert an empty batch of images")
+    width, height = images[0].width, images[0].height
+    if any(image.width != width or image.height != height for image in images):
+        raise ValueError("Images of a batch must have the same size")
+    return (len(images), height, width)
+
+
+def _check_bgra_batch(array):
+    if array.dtype != numpy.uint8 or array.ndim != 4 or array.shape[3] != 4:
+        raise ValueError("Expected a (N, height, width, 4) uint8 array")
+    return array
+
+
+def _labels(bgra, out=None):
+    if out is None:
+        return bgra[..., 2]
+    numpy.copyto(out, bgra[..., 2])
+    return out
+
+
+def _decode_depth(bgra, out=None):
+    if out is None:
+        out = numpy.empty(bgra.shape[:-1], dtype=numpy.float32)
+    # Read each BGRA pixel as a big-endian uint32, shifting out the alpha
+    # byte leaves R + G * 256 + B * 256 * 256.
+    encoded = numpy.ascontiguousarray(bgra).view(numpy.dtype('>u4'))[..., 0]
+    depth = out.view(numpy.uint32)
+    numpy.right_shift(encoded, 8, out=depth)
+    # Normalize by (256 * 256 * 256 - 1).
+    numpy.multiply(depth, numpy.float32(1.0 / 16777215.0), out=out, dtype=numpy.float32)
+    return out
+
+
+def _logarithmic_uint8(depth, out=None, channels=1):
+    """Log grayscale of a float32 depth array, computed in place."""
+    # 255 * (1 + log(depth) / 5.70378), clipped to [0, 255].
+    with numpy.errstate(divide='ignore'):
+        numpy.log(depth, out=depth)
+    depth *= numpy.float32(255.0 / 5.70378)
+    depth += numpy.float32(255.0)
+    numpy.clip(depth, 0.0, 255.0, out=depth)
+    numpy.rint(depth, out=depth)
+    shape = depth.shape
+    if channels != 1:
+        shape = shape + (channels,)
+        depth = depth[..., numpy.newaxis]
+    if out is None:
+        out = numpy.empty(shape, dtype=numpy.uint8)
+    numpy.copyto(out, depth, casting='unsafe')
+    return out
+
+
+def camera_rays(width, height, fov):
+    """
+    Return a read-only (height * width, 3) float32 array with the ray of each
+    pixel of a camera, in row-major pixel order, scaled to unit depth: the
+    position relative to the camera of a point at depth 1.0. Cached per
+    camera configuration.
+    """
+    return _camera_rays(int(width), int(height), float(fov))
+
+
+@functools.lru_cache(maxsize=16)
+def _camera_rays(width, height, fov):
+    # (Intrinsic) K Matrix, inverted: [(u - cx) / f, (v - cy) / f, 1].
+    focal = width / (2.0 * math.tan(fov * math.pi / 360.0))
+    # 2d pixel coordinates, mirrored.
+    u_coord = numpy.arange(width - 1, -1, -1, dtype=numpy.float64)
+    v_coord = numpy.arange(height - 1, -1, -1, dtype=numpy.float64)
+    rays = numpy.empty((height, width, 3), dtype=numpy.float32)
+    rays[:, :, 0] = (u_coord - width / 2.0) / focal
+    rays[:, :, 1] = ((v_coord - height / 2.0) / focal)[:, numpy.newaxis]
+    rays[:, :, 2] = 1.0
+    rays = rays.reshape(width * height, 3)
+    rays.setflags(write=False)
+    return rays
+
+
 def depth_to_local_point_cloud(image, color=None, max_depth=0.9):
     """
     Convert an image containing CARLA encoded depth-map to a 2D array containing
     the 3D position (relative to the camera) of each pixel and its corresponding
-    RGB color of an array.
+    RGB color of an array. Points are float32, computed from the cached
+    "camera_rays" of the image's camera.
     "max_depth" is used to omit the points that are far enough.
     """
     far = 1000.0  # max depth in meters.
-    normalized_depth = depth_to_array(image)
-
-    # (Intrinsic) K Matrix
-    k = numpy.identity(3)
-    k[0, 2] = image.width / 2.0
-    k[1, 2] = image.height / 2.0
-    k[0, 0] = k[1, 1] = image.width / \
-        (2.0 * math.tan(image.fov * math.pi / 360.0))
-
-    # 2d pixel coordinates
-    pixel_length = image.width * image.height
-    u_coord = repmat(numpy.r_[image.width-1:-1:-1],
-                     image.height, 1).reshape(pixel_length)
-    v_coord = repmat(numpy.c_[image.height-1:-1:-1],
-                     1, image.width).reshape(pixel_length)
-    if color is not None:
-        color = color.reshape(pixel_length, 3)
-    normalized_depth = numpy.reshape(normalized_depth, pixel_length)
-
-    # Search for pixels where the depth is greater than max_depth to
-    # delete them
-    max_depth_indexes = numpy.where(normalized_depth > max_depth)
-    normalized_depth = numpy.delete(normalized_depth, max_depth_indexes)
-    u_coord = numpy.delete(u_coord, max_depth_indexes)
-    v_coord = numpy.delete(v_coord, max_depth_indexes)
-    if color is not None:
-        color = numpy.delete(color, max_depth_indexes, axis=0)
+    normalized_depth = depth_to_array(image).reshape(image.width * image.height)
+    rays = camera_rays(image.width, image.height, image.fov)
 
-    # pd2 = [u,v,1]
-    p2d = numpy.array([u_coord, v_coord, numpy.ones_like(u_coord)])
+    # Keep the pixels up to max_depth.
+    mask = normalized_depth <= max_depth
+    depth = normalized_depth[mask]
+    depth *= far
 
     # P = [X,Y,Z]
-    p3d = numpy.dot(numpy.linalg.inv(k), p2d)
-    p3d *= normalized_depth * far
+    p3d = numpy.compress(mask, rays, axis=0)
+    p3d *= depth[:, numpy.newaxis]
 
-    # Formating the output to:
-    # [[X1,Y1,Z1,R1,G1,B1],[X2,Y2,Z2,R2,G2,B2], ... [Xn,Yn,Zn,Rn,Gn,Bn]]
     if color is not None:
-        # numpy.concatenate((numpy.transpose(p3d), color), axis=1)
-        return sensor.PointCloud(
-            image.frame_number,
-            numpy.transpose(p3d),
-            color_array=color)
+        color = numpy.compress(mask, color.reshape(image.width * image.height, 3), axis=0)
+        return sensor.PointCloud(image.frame_number, p3d, color_array=color)
     # [[X1,Y1,Z1],[X2,Y2,Z2], ... [Xn,Yn,Zn]]
-    return sensor.PointCloud(image.frame_number, numpy.transpose(p3d))
+    return sensor.PointCloud(image.frame_number, p3d)
+
+
+def point_cloud_to_bev(point_cloud, out=None, x_range=(-40.0, 40.0), y_range=(-40.0, 40.0),
+                       z_range=(-2.5, 1.5), resolution=0.25, max_density=64):
+    """
+    Rasterize a point cloud (a PointCloud, LidarMeasurement or (n, 3) array)
+    into a bird's-eye view float32 array of (rows, columns, 3) cells of
+    "resolution" meters, written to "out" if given. Row 0 is at the largest
+    x, column 0 at the smallest y, and only points within the x, y and z
+    ranges are used. The channels of each cell are:
+
+      - occupancy: 1.0 if any point falls in the cell;
+      - max height: the highest z of its points, scaled from z_range to [0, 1];
+      - density: log(1 + points) / log(max_density), clipped to 1.
+    """
+    points = getattr(point_cloud, 'point_cloud', point_cloud)
+    points = getattr(points, 'array', points)
+    rows = int(round((x_range[1] - x_range[0]) / resolution))
+    columns = int(round((y_range[1] - y_range[0]) / resolution))
+    if out is None:
+        out = numpy.empty((rows, columns, 3), dtype=numpy.float32)
+    elif out.shape != (rows, columns, 3) or not out.flags.c_contiguous:
+        raise ValueError("Expected a contiguous (%d, %d, 3) output array" % (rows, columns))
+
+    x, y, z = points[:, 0], points[:, 1], points[:, 2]
+    mask = (x > x_range[0]) & (x <= x_range[1])
+    mask &= (y >= y_range[0]) & (y < y_range[1])
+    mask &= (z >= z_range[0]) & (z <= z_range[1])
+    x, y, z = x[mask], y[mask], z[mask]
+
+    row = ((x_range[1] - x) * (1.0 / resolution)).astype(numpy.intp)
+    numpy.minimum(row, rows - 1, out=row)
+    column = ((y - y_range[0]) * (1.0 / resolution)).astype(numpy.intp)
+    numpy.minimum(column, columns - 1, out=column)
+    cells = row * columns + column
+
+    cell_count = rows * columns
+    flat = out.reshape(cell_count, 3)
+    counts = numpy.bincount(cells, minlength=cell_count)
+    numpy.greater(counts, 0, out=flat[:, 0])
+    height = flat[:, 1]
+    height.fill(0.0)
+    numpy.maximum.at(height, cells, (z - z_range[0]) * (1.0 / (z_range[1] - z_range[0])))
+    density = flat[:, 2]
+    numpy.log1p(counts, out=density, dtype=numpy.float32)
+    density *= numpy.float32(1.0 / math.log(max_density))
+    numpy.minimum(density, 1.0, out=density)
+    return out
@@ -0,0 +1,171 @@
+# Copyright (c) 2017 Computer Vision Center (CVC) at the Universitat Autonoma de
+# Barcelona (UAB).
+#
+# This work is licensed under the terms of the MIT license.
+# For a copy, see <https://opensource.org/licenses/MIT>.
+
+"""Helpers for the Measurements sent by the server every frame."""
+
+try:
+    from . import carla_server_pb2 as carla_protocol
+except ImportError:
+    raise RuntimeError('cannot import "carla_server_pb2.py", run the protobuf compiler to generate this file')
+
+try:
+    import numpy
+except ImportError:
+    raise RuntimeError('cannot import numpy, make sure numpy package is installed.')
+
+
+AGENT_KINDS = ('vehicle', 'pedestrian', 'traffic_light', 'speed_limit_sign')
+
+# One row per non-player agent. "rotation" holds (pitch, yaw, roll) in
+# degrees, "yaw" repeats it for quick heading checks. "box_offset" and
+# "extent" are the location of the bounding box relative to the agent and its
+# half size, zero for agents without a box. "speed" holds the forward speed of
+# vehicles and pedestrians and the speed limit of speed limit signs (m/s).
+# "state" holds the state of traffic lights, -1 for other agents.
+AGENT_DTYPE = numpy.dtype([
+    ('id', '<u4'),
+    ('location', '<f4', (3,)),
+    ('rotation', '<f4', (3,)),
+    ('yaw', '<f4'),
+    ('box_offset', '<f4', (3,)),
+    ('extent', '<f4', (3,)),
+    ('speed', '<f4'),
+    ('state', '<i4')])
+
+
+def decode_non_player_agents(non_player_agents, kinds=AGENT_KINDS):
+    """
+    Decode the non_player_agents of a Measurements message into one
+    structured array of AGENT_DTYPE per kind in "kinds", in a single pass.
+
+    Return a dict mapping each kind to its array.
+    """
+    rows = dict((kind, []) for kind in kinds)
+    no_box = (0.0, 0.0, 0.0)
+    for agent in non_player_agents:
+        kind = agent.WhichOneof('agent')
+        kind_rows = rows.get(kind)
+        if kind_rows is None:
+            continue
+        value = getattr(agent, kind)
+        transform = value.transform
+        location = transform.location
+        location = (location.x, location.y, location.z)
+        rotation = transform.rotation
+        rotation = (rotation.pitch, rotation.yaw, rotation.roll)
+        if kind == 'vehicle' or kind == 'pedestrian':
+            box = value.bounding_box
+            offset = box.transform.location
+            extent = box.extent
+            kind_rows.append((
+                agent.id, location, rotation, rotation[1],
+                (offset.x, offset.y, offset.z), (extent.x, extent.y, extent.z),
+                value.forward_speed, -1))
+        elif kind == 'traffic_light':
+            kind_rows.append((
+                agent.id, location, rotation, rotation[1],
+                no_box, no_box, 0.0, value.state))
+        else:
+            kind_rows.append((
+                agent.id, location, rotation, rotation[1],
+                no_box, no_box, value.speed_limit, -1))
+    return dict((kind, numpy.array(rows[kind], dtype=AGENT_DTYPE)) for kind in kinds)
+
+
+# Wire tag of Measurements.non_player_agents (field 4, length-delimited).
+_AGENTS_TAG = (4 << 3) | 2
+
+
+class LazyMeasurements(object):
+    """
+    Measurements message that defers decoding the non_player_agents.
+
+    The raw message is scanned once to split the non_player_agents entries
+    from the other fields. Those are parsed right away and can be read as
+    attributes like in a Measurements message, while non_player_agents is
+    only parsed when first accessed.
+    """
+
+    def __init__(self, data):
+        data = memoryview(data)
+        header_spans, agent_spans = _split_agents(data)
+        self._header = carla_protocol.Measurements()
+        self._header.ParseFromString(_join_spans(data, header_spans))
+        self._agent_data = _join_spans(data, agent_spans) if agent_spans else None
+        self._agents = None
+
+    @property
+    def non_player_agents(self):
+        if self._agents is None:
+            message = carla_protocol.Measurements()
+            if self._agent_data is not None:
+                message.ParseFromString(self._agent_data)
+                self._agent_data = None
+            self._agents = message.non_player_agents
+        return self._agents
+
+    def __getattr__(self, name):
+        return getattr(self._header, name)
+
+
+def _join_spans(data, spans):
+    if len(spans) == 1:
+        start, end = spans[0]
+        return data[start:end].tobytes()
+    return b''.join(data[start:end] for start, end in spans)
+
+
+def _split_agents(data):
+    """
+    Scan the top level fields of a serialized Measurements message. Return
+    the (start, end) spans holding non_player_agents entries and those
+    holding every other field, adjacent spans merged.
+    """
+    header_spans = []
+    agent_spans = []
+    position = 0
+    end = len(data)
+    while position < end:
+        start = position
+        tag = data[position]
+        position += 1
+        if tag >= 0x80:
+            tag, position = _read_varint(data, start)
+        wire_type = tag & 0x07
+        if wire_type == 2:
+            length = data[position]
+            position += 1
+            if length >= 0x80:
+                length, position = _read_varint(data, position - 1)
+            position += length
+        elif wire_type == 0:
+            _, position = _read_varint(data, position)
+        elif wire_type == 1:
+            position += 8
+        elif wire_type == 5:
+            position += 4
+        else:
+            raise ValueError('unsupported wire type %d in Measurements' % wire_type)
+        spans = agent_spans if tag == _AGENTS_TAG else header_spans
+        if spans and spans[-1][1] == start:
+            spans[-1] = (spans[-1][0], position)
+        else:
+            spans.append((start, position))
+    if position != end:
+        raise ValueError('truncated Measurements message')
+    return header_spans, agent_spans
+
+
+def _read_varint(data, position):
+    result = 0
+    shift = 0
+    while True:
+        byte = data[position]
+        position += 1
+        result |= (byte & 0x7f) << shift
+        if byte < 0x80:
+            return result, position
+        shift += 7
@@ -0,0 +1,531 @@
+#!/usr/bin/env python3
+
+# Copyright (c) 2017 Computer Vision Center (CVC) at the Universitat Autonoma de
+# Barcelona (UAB).
+#
+# This work is licensed under the terms of the MIT license.
+# For a copy, see <https://opensource.org/licenses/MIT>.
+
+"""
+Stand-in CARLA server speaking the carla_server.proto protocol.
+
+Serves the world, stream and control ports like the simulator, with
+synthetic data: for every sensor of the CarlaSettings.ini received it
+streams a procedurally generated camera image (scene, depth or semantic
+segmentation) or lidar sweep, plus player measurements and non-player
+agents. Meant for testing and benchmarking clients without a simulator.
+
+    python -m carla.mock_server -p 2000
+"""
+
+import argparse
+import configparser
+import logging
+import math
+import random
+import socket
+import struct
+import threading
+import time
+
+try:
+    from . import carla_server_pb2 as carla_protocol
+except ImportError:
+    raise RuntimeError('cannot import "carla_server_pb2.py", run the protobuf compiler to generate this file')
+
+try:
+    import numpy
+except ImportError:
+    raise RuntimeError('cannot import numpy, make sure numpy package is installed.')
+
+
+_IMAGE_TYPES = ['None', 'SceneFinal', 'Depth', 'SemanticSegmentation']
+
+_NUMBER_OF_PLAYER_STARTS = 20
+
+
+class MockCarlaServer(object):
+    """
+    Listens on world_port, world_port + 1 and world_port + 2 and serves one
+    client at a time, as many episodes as requested.
+
+    Camera sizes and agent counts are taken from the settings sent by the
+    client unless overridden with image_size=(width, height),
+    number_of_vehicles or number_of_pedestrians. Traffic lights and speed
+    limit signs are only sent with SendNonPlayerAgentsInfo. In synchronous
+    mode a frame is sent every time a control is received, otherwise frames
+    are sent at "fps". A world_port of 0 picks free ports.
+    """
+
+    def __init__(self, host='localhost', world_port=2000, fps=10.0, image_size=None,
+                 number_of_vehicles=None, number_of_pedestrians=None,
+                 number_of_traffic_lights=40, number_of_speed_limit_signs=20, timeout=15):
+        self.fps = fps
+        self.image_size = image_size
+        self.number_of_vehicles = number_of_vehicles
+        self.number_of_pedestrians = number_of_pedestrians
+        self.number_of_traffic_lights = number_of_traffic_lights
+        self.number_of_speed_limit_signs = number_of_speed_limit_signs
+        self._timeout = timeout
+        self._listeners = _listen(host, world_port, 3)
+        self.world_port = self._listeners[0].getsockname()[1]
+        self._thread = None
+        self._world = None
+        self._stopped = False
+
+    def start(self):
+        """Serve clients in a background thread."""
+        self._thread = threading.Thread(target=self.serve_forever)
+        self._thread.daemon = True
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """Stop serving and close the listening sockets."""
+        self._stopped = True
+        for connection in self._listeners + [self._world]:
+            if connection is not None:
+                _shutdown(connection)
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def serve_forever(self):
+        while not self._stopped:
+            try:
+                connection, address = self._listeners[0].accept()
+            except OSError:
+                break
+            logging.debug('mock server: client connected from %s:%s', *address)
+            self._world = connection
+            try:
+                self._serve_client(connection)
+            except (OSError, ConnectionError) as exception:
+                logging.debug('mock server: %s', exception)
+            finally:
+                self._world = None
+                connection.close()
+        for listener in self._listeners:
+            listener.close()
+
+    def _serve_client(self, world):
+        episode = None
+        try:
+            while True:
+                data = _recv(world)
+                if episode is not None:
+                    episode.stop()
+                    episode = None
+                request = carla_protocol.RequestNewEpisode()
+                request.ParseFromString(data)
+                settings = _Settings(request.ini_file, self)
+                _send(world, settings.scene_description().SerializeToString())
+
+                start = carla_protocol.EpisodeStart()
+                start.ParseFromString(_recv(world))
+                ready = carla_protocol.EpisodeReady()
+                ready.ready = True
+                _send(world, ready.SerializeToString())
+
+                stream = self._accept(self._listeners[1])
+                control = self._accept(self._listeners[2])
+                episode = _Episode(settings, start.player_start_spot_index, stream, control, self.fps)
+                episode.start()
+        finally:
+            if episode is not None:
+                episode.stop()
+
+    def _accept(self, listener):
+        listener.settimeout(self._timeout)
+        connection, _ = listener.accept()
+        connection.settimeout(None)
+        return connection
+
+
+class _Settings(object):
+    """The parts of a CarlaSettings.ini the mock server acts upon."""
+
+    def __init__(self, ini_file, server):
+        ini = configparser.ConfigParser()
+        ini.optionxform = str
+        ini.read_string(ini_file)
+        self.synchronous_mode = ini.getboolean('CARLA/Server', 'SynchronousMode', fallback=True)
+        self.send_agents = ini.getboolean('CARLA/Server', 'SendNonPlayerAgentsInfo', fallback=False)
+        level = 'CARLA/LevelSettings'
+        self.number_of_vehicles = server.number_of_vehicles
+        if self.number_of_vehicles is None:
+            self.number_of_vehicles = ini.getint(level, 'NumberOfVehicles', fallback=20)
+        self.number_of_pedestrians = server.number_of_pedestrians
+        if self.number_of_pedestrians is None:
+            self.number_of_pedestrians = ini.getint(level, 'NumberOfPedestrians', fallback=30)
+        self.number_of_traffic_lights = server.number_of_traffic_lights
+        self.number_of_speed_limit_signs = server.number_of_speed_limit_signs
+        self.seed = ini.getint(level, 'SeedVehicles', fallback=0)
+        self.sensors = []
+        names = ini.get('CARLA/Sensor', 'Sensors', fallback='')
+        for sensor_id, name in enumerate(n for n in names.split(',') if n):
+            section = ini['CARLA/Sensor/' + name]
+            self.sensors.append(_make_sensor(sensor_id, name, section, server.image_size))
+
+    def scene_description(self):
+        scene = carla_protocol.SceneDescription()
+        for index in range(_NUMBER_OF_PLAYER_STARTS):
+            spot = scene.player_start_spots.add()
+            spot.location.x = 10.0 * index
+            spot.location.z = 0.2
+        for sensor in self.sensors:
+            definition = scene.sensors.add()
+            definition.id = sensor.id
+            definition.name = sensor.name
+            definition.type = sensor.type
+        return scene
+
+
+def _make_sensor(sensor_id, name, section, image_size):
+    sensor_type = section.get('SensorType', 'CAMERA')
+    if sensor_type == 'LIDAR_RAY_CAST':
+        return _Lidar(sensor_id, name, section)
+    if sensor_type != 'CAMERA':
+        raise ValueError('mock server: unknown sensor type %r' % sensor_type)
+    return _Camera(sensor_id, name, section, image_size)
+
+
+class _Camera(object):
+    type = carla_protocol.Sensor.CAMERA
+
+    def __init__(self, sensor_id, name, section, image_size):
+        self.id = sensor_id
+        self.name = name
+        if image_size is None:
+            image_size = (section.getint('ImageSizeX', 720), section.getint('ImageSizeY', 512))
+        self.width, self.height = image_size
+        self.fov = section.getfloat('FOV', 90.0)
+        post_processing = section.get('PostProcessing', 'SceneFinal')
+        self.image_type = _IMAGE_TYPES.index(post_processing) if post_processing in _IMAGE_TYPES else 0
+        self.pixels = _make_pixels(post_processing, self.width, self.height)
+
+    def send(self, connection, frame_number, _):
+        header = struct.pack(
+            '<LQLLLf', self.id, frame_number, self.width, self.height, self.image_type, self.fov)
+        connection.sendall(struct.pack('<L', len(header) + len(self.pixels)) + header)
+        connection.sendall(self.pixels)
+
+
+def _make_pixels(post_processing, width, height):
+    """Procedural BGRA image of the given post-processing type."""
+    bgra = numpy.zeros((height, width, 4), dtype=numpy.uint8)
+    rows = numpy.linspace(0.0, 1.0, height, dtype=numpy.float64)[:, numpy.newaxis]
+    columns = numpy.linspace(0.0, 1.0, width, dtype=numpy.float64)[numpy.newaxis, :]
+    if post_processing == 'Depth':
+        # Far away at the top of the image, close at the bottom.
+        depth = numpy.broadcast_to(0.002 + 0.5 * (1.0 - rows) ** 4, (height, width))
+        encoded = (depth * 16777215.0).astype(numpy.uint32)
+        bgra[:, :, 2] = encoded & 0xff
+        bgra[:, :, 1] = (encoded >> 8) & 0xff
+        bgra[:, :, 0] = (encoded >> 16) & 0xff
+    elif post_processing == 'SemanticSegmentation':
+        # Bands of buildings, vegetation, sidewalks and road.
+        labels = numpy.select(
+            [rows < 0.3, rows < 0.5, rows < 0.6, rows < 0.62],
+            [1, 9, 8, 6], default=7)
+        bgra[:, :, 2] = numpy.broadcast_to(labels, (height, width))
+    else:
+        bgra[:, :, 0] = 255.0 * columns
+        bgra[:, :, 1] = 255.0 * rows
+        bgra[:, :, 2] = 128
+    bgra[:, :, 3] = 255
+    return bgra.tobytes()
+
+
+class _Lidar(object):
+    type = carla_protocol.Sensor.LIDAR_RAY_CAST
+
+    def __init__(self, sensor_id, name, section):
+        self.id = sensor_id
+        self.name = name
+        self.channels = section.getint('Channels', 32)
+        self.range = section.getfloat('Range', 50.0)
+        self.points_per_second = section.getint('PointsPerSecond', 56000)
+        self.rotation_frequency = section.getfloat('RotationFrequency', 10.0)
+        self.upper_fov = section.getfloat('UpperFovLimit', 10.0)
+        self.lower_fov = section.getfloat('LowerFovLimit', -30.0)
+
+    def send(self, connection, frame_number, fps):
+        # Points of the part of the sweep covered in one frame, on a cylinder
+        # of radius "range" around the sensor.
+        points_per_channel = max(1, int(self.points_per_second / fps / self.channels))
+        sweep = 2.0 * math.pi * min(1.0, self.rotation_frequency / fps)
+        start = (frame_number * sweep) % (2.0 * math.pi)
+        angles = start + numpy.linspace(0.0, sweep, points_per_channel, dtype=numpy.float32)
+        pitches = numpy.radians(numpy.linspace(
+            self.upper_fov, self.lower_fov, self.channels, dtype=numpy.float32))
+        points = numpy.empty((self.channels, points_per_channel, 3), dtype=numpy.float32)
+        points[:, :, 0] = self.range * numpy.cos(angles)
+        points[:, :, 1] = self.range * numpy.sin(angles)
+        points[:, :, 2] = self.range * numpy.tan(pitches)[:, numpy.newaxis]
+        counts = numpy.full(self.channels, points_per_channel, dtype=numpy.uint32)
+        header = struct.pack('<LQfL', self.id, frame_number, math.degrees(start), self.channels)
+        payload = counts.tobytes() + points.tobytes()
+        connection.sendall(struct.pack('<L', len(header) + len(payload)) + header)
+        connection.sendall(payload)
+
+
+class _Episode(object):
+    """Streams the frames of one episode and applies the controls received."""
+
+    def __init__(self, settings, player_start_index, stream, control, fps):
+        self._settings = settings
+        self._stream = stream
+        self._control = control
+        self._fps = fps
+        self._thread = threading.Thread(target=self._run)
+        self._thread.daemon = True
+        self._stopped = False
+        self._lock = threading.Lock()
+        self._last_control = carla_protocol.Control()
+        self._measurements = carla_protocol.Measurements()
+        player = self._measurements.player_measurements
+        player.transform.location.x = 10.0 * (player_start_index % _NUMBER_OF_PLAYER_STARTS)
+        player.transform.location.z = 0.2
+        player.bounding_box.extent.x = 2.3
+        player.bounding_box.extent.y = 1.0
+        player.bounding_box.extent.z = 0.8
+        player.autopilot_control.throttle = 0.6
+        self._agents = _serialize_agents(settings) if settings.send_agents else b''
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stopped = True
+        for connection in (self._stream, self._control):
+            _shutdown(connection)
+            connection.close()
+        self._thread.join()
+
+    def _run(self):
+        if not self._settings.synchronous_mode:
+            reader = threading.Thread(target=self._read_controls)
+            reader.daemon = True
+            reader.start()
+        frame_number = 0
+        next_frame = time.time()
+        try:
+            while not self._stopped:
+                frame_number += 1
+                self._send_frame(frame_number)
+                if self._settings.synchronous_mode:
+                    control = carla_protocol.Control()
+                    control.ParseFromString(_recv(self._control))
+                    self._apply(control)
+                else:
+                    next_frame += 1.0 / self._fps
+                    time.sleep(max(0.0, next_frame - time.time()))
+                    with self._lock:
+                        self._apply(self._last_control)
+        except (OSError, ConnectionError):
+            pass
+
+    def _read_controls(self):
+        try:
+            while not self._stopped:
+                control = carla_protocol.Control()
+                control.ParseFromString(_recv(self._control))
+                with self._lock:
+                    self._last_control = control
+        except (OSError, ConnectionError):
+            pass
+
+    def _apply(self, control):
+        """Rough kinematics so the measurements follow the controls."""
+        delta = 1.0 / self._fps
+        player = self._measurements.player_measurements
+        acceleration = 4.0 * control.throttle - 8.0 * control.brake
+        if control.hand_brake:
+            acceleration = -8.0
+        speed = max(0.0, player.forward_speed + acceleration * delta)
+        player.acceleration.x = acceleration
+        player.forward_speed = speed
+        rotation = player.transform.rotation
+        rotation.yaw = (rotation.yaw + 30.0 * control.steer * speed * delta + 180.0) % 360.0 - 180.0
+        distance = -speed * delta if control.reverse else speed * delta
+        player.transform.location.x += distance * math.cos(math.radians(rotation.yaw))
+        player.transform.location.y += distance * math.sin(math.radians(rotation.yaw))
+
+    def _send_frame(self, frame_number):
+        measurements = self._measurements
+        measurements.frame_number = frame_number
+        measurements.platform_timestamp = int(time.time() * 1000.0) & 0xffffffff
+        measurements.game_timestamp = int(frame_number * 1000.0 / self._fps)
+        # Serialized messages concatenate into their merge, the agents are
+        # serialized once per episode.
+        _send(self._stream, measurements.SerializeToString() + self._agents)
+        for sensor in self._settings.sensors:
+            sensor.send(self._stream, frame_number, self._fps)
+        _send(self._stream, b'')
+
+
+def _serialize_agents(settings):
+    rng = random.Random(settings.seed)
+    message = carla_protocol.Measurements()
+    counts = [
+        ('vehicle', settings.number_of_vehicles),
+        ('pedestrian', settings.number_of_pedestrians),
+        ('traffic_light', settings.number_of_traffic_lights),
+        ('speed_limit_sign', settings.number_of_speed_limit_signs)]
+    agent_id = 1
+    for kind, count in counts:
+        for _ in range(count):
+            agent = message.non_player_agents.add()
+            agent.id = agent_id
+            agent_id += 1
+            value = getattr(agent, kind)
+            value.transform.location.x = rng.uniform(0.0, 400.0)
+            value.transform.location.y = rng.uniform(0.0, 400.0)
+            value.transform.rotation.yaw = rng.choice([-180.0, -90.0, 0.0, 90.0])
+            if kind == 'vehicle':
+                value.forward_speed = rng.uniform(0.0, 14.0)
+                value.bounding_box.extent.x = 2.3
+                value.bounding_box.extent.y = 1.0
+                value.bounding_box.extent.z = 0.8
+                value.bounding_box.transform.location.z = 0.7
+            elif kind == 'pedestrian':
+                value.forward_speed = rng.uniform(0.0, 2.0)
+                value.bounding_box.extent.x = 0.3
+                value.bounding_box.extent.y = 0.3
+                value.bounding_box.extent.z = 0.9
+            elif kind == 'traffic_light':
+                value.state = rng.choice([
+                    carla_protocol.TrafficLight.GREEN,
+                    carla_protocol.TrafficLight.YELLOW,
+                    carla_protocol.TrafficLight.RED])
+            else:
+                value.speed_limit = rng.choice([30.0, 60.0, 90.0]) / 3.6
+    return message.SerializeToString()
+
+
+def _listen(host, port, count):
+    """Listen on "count" consecutive ports from port, or from any if 0."""
+    while True:
+        listeners = []
+        try:
+            for index in range(count):
+                listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+                listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+                listeners.append(listener)
+                listener.bind((host, listeners[0].getsockname()[1] + index if index else port))
+                listener.listen(1)
+            return listeners
+        except OSError:
+            for listener in listeners:
+                listener.close()
+            if port:
+                raise
+
+
+def _shutdown(connection):
+    try:
+        connection.shutdown(socket.SHUT_RDWR)
+    except OSError:
+        pass
+
+
+def _send(connection, message):
+    connection.sendall(struct.pack('<L', len(message)) + message)
+
+
+def _recv(connection):
+    header = _recv_n(connection, 4)
+    return _recv_n(connection, struct.unpack('<L', header)[0])
+
+
+def _recv_n(connection, length):
+    buf = bytearray(length)
+    view = memoryview(buf)
+    offset = 0
+    while offset < length:
+        received = connection.recv_into(view[offset:])
+        if not received:
+            raise ConnectionError('connection closed')
+        offset += received
+    return bytes(buf)
+
+
+def main():
+    argparser = argparse.ArgumentParser(description=__doc__)
+    argparser.add_argument(
+        '-v', '--verbose',
+        action='store_true',
+        dest='debug',
+        help='print debug information')
+    argparser.add_argument(
+        '--host',
+        metavar='H',
+        default='localhost',
+        help='IP to listen on (default: localhost)')
+    argparser.add_argument(
+        '-p', '--port',
+        metavar='P',
+        default=2000,
+        type=int,
+        help='world port, stream and control use the next two (default: 2000)')
+    argparser.add_argument(
+        '--fps',
+        default=10.0,
+        type=float,
+        help='simulated frame rate (default: 10)')
+    argparser.add_argument(
+        '--image-size',
+        metavar='WxH',
+        default=None,
+        help='override the size of every camera, e.g. 800x600')
+    argparser.add_argument(
+        '--vehicles',
+        default=None,
+        type=int,
+        help='override NumberOfVehicles')
+    argparser.add_argument(
+        '--pedestrians',
+        default=None,
+        type=int,
+        help='override NumberOfPedestrians')
+    argparser.add_argument(
+        '--traffic-lights',
+        default=40,
+        type=int,
+        help='number of traffic lights (default: 40)')
+    argparser.add_argument(
+        '--speed-limit-signs',
+        default=20,
+        type=int,
+        help='number of speed limit signs (default: 20)')
+    args = argparser.parse_args()
+
+    log_level = logging.DEBUG if args.debug else logging.INFO
+    logging.basicConfig(format='%(levelname)s: %(message)s', level=log_level)
+
+    image_size = None
+    if args.image_size is not None:
+        image_size = tuple(int(x) for x in args.image_size.lower().split('x'))
+
+    server = MockCarlaServer(
+        args.host,
+        args.port,
+        fps=args.fps,
+        image_size=image_size,
+        number_of_vehicles=args.vehicles,
+        number_of_pedestrians=args.pedestrians,
+        number_of_traffic_lights=args.traffic_lights,
+        number_of_speed_limit_signs=args.speed_limit_signs)
+    logging.info('mock server listening on %s:%d', args.host, server.world_port)
+    try:
+        server.serve_forever()
+    finally:
+        server.stop()
+
+
+if __name__ == '__main__':
+    try:
+        main()
+    except KeyboardInterrupt:
+        print('\nCancelled by user. Bye!')
@@ -0,0 +1,145 @@
+# Copyright (c) 2017 Computer Vision Center (CVC) at the Universitat Autonoma de
+# Barcelona (UAB).
+#
+# This work is licensed under the terms of the MIT license.
+# For a copy, see <https://opensource.org/licenses/MIT>.
+
+"""Projection of the agents' bounding boxes into camera images."""
+
+import math
+
+try:
+    import numpy
+except ImportError:
+    raise RuntimeError('cannot import numpy, make sure numpy package is installed.')
+
+from . import image_converter
+from . import sensor
+from .transform import Transform, transform_matrices, _transform_points
+
+
+# One row per box visible in a camera. "corners" holds the (column, row)
+# pixel of each of the 8 corners, "bbox" the 2D box (xmin, ymin, xmax, ymax)
+# clipped to the image, "distance" the depth in meters of the nearest corner
+# and "visibility" the fraction of the corners inside the image that are not
+# occluded in the depth buffer, 1.0 if it cannot be tested.
+BOX_DTYPE = numpy.dtype([
+    ('id', '<u4'),
+    ('kind', '<U10'),
+    ('corners', '<f4', (8, 2)),
+    ('bbox', '<f4', (4,)),
+    ('distance', '<f4'),
+    ('visibility', '<f4')])
+
+# Corners of a box of half size one, relative to its center.
+_UNIT_CORNERS = numpy.array([
+    [x, y, z] for x in (1.0, -1.0) for y in (1.0, -1.0) for z in (1.0, -1.0)])
+
+
+class BoxProjector(object):
+    """
+    Projects the bounding boxes of the non-player agents into the image of a
+    sensor.Camera attached to the player.
+
+    All the boxes of a frame go through world, agent, camera and image space
+    in a single set of array operations. Boxes crossing the near plane,
+    farther than "max_distance" or outside the image are culled, and with a
+    depth buffer so are boxes with every corner in the image occluded by more
+    than "occlusion_tolerance" meters.
+    """
+
+    def __init__(self, camera, near=0.1, max_distance=100.0, occlusion_tolerance=1.0):
+        self.camera = camera
+        self.near = near
+        self.max_distance = max_distance
+        self.occlusion_tolerance = occlusion_tolerance
+
+    def project(self, agents, player_transform, depth=None, kinds=('vehicle', 'pedestrian')):
+        """
+        Project the boxes of the agents of "kinds" in "agents", a dict as
+        returned by carla.measurements.decode_non_player_agents, seen from
+        the player at "player_transform" (a Transform or the protobuf
+        transform of the player measurements). "depth" is the frame of a
+        depth camera with the same pose and image settings, either an Image
+        or its normalized depth array (see image_converter.depth_to_array).
+
+        Return a structured array of BOX_DTYPE.
+        """
+        arrays = [agents[kind] for kind in kinds if len(agents.get(kind, ()))]
+        if not arrays:
+            return numpy.empty(0, dtype=BOX_DTYPE)
+        rows = numpy.concatenate(arrays)
+        kind_names = numpy.repeat(
+            [kind for kind in kinds if len(agents.get(kind, ()))],
+            [len(array) for array in arrays])
+
+        points = self._camera_points(rows, player_transform)
+        depths = points[:, :, 2]
+        distance = depths.min(axis=1)
+        keep = (distance > self.near) & (distance < self.max_distance)
+        points = points[keep]
+        depths = depths[keep]
+
+        # Camera to image space, the pixels are mirrored like in
+        # image_converter.camera_rays.
+        width = self.camera.ImageSizeX
+        height = self.camera.ImageSizeY
+        focal = width / (2.0 * math.tan(self.camera.FOV * math.pi / 360.0))
+        corners = numpy.empty(points.shape[:2] + (2,), dtype=numpy.float32)
+        corners[:, :, 0] = (width - 1) - (points[:, :, 0] * focal / depths + width / 2.0)
+        corners[:, :, 1] = (height - 1) - (points[:, :, 1] * focal / depths + height / 2.0)
+
+        low = corners.min(axis=1)
+        high = corners.max(axis=1)
+        in_frustum = (
+            (high[:, 0] >= -0.5) & (low[:, 0] <= width - 0.5) &
+            (high[:, 1] >= -0.5) & (low[:, 1] <= height - 0.5))
+
+        visibility = numpy.ones(len(corners), dtype=numpy.float32)
+        if depth is not None:
+            visibility = self._visibility(corners, depths, depth)
+            in_frustum &= visibility > 0.0
+
+        boxes = numpy.empty(numpy.count_nonzero(in_frustum), dtype=BOX_DTYPE)
+        boxes['id'] = rows['id'][keep][in_frustum]
+        boxes['kind'] = kind_names[keep][in_frustum]
+        boxes['corners'] = corners[in_frustum]
+        bbox = boxes['bbox']
+        bbox[:, 0:2] = low[in_frustum]
+        bbox[:, 2:4] = high[in_frustum]
+        numpy.clip(bbox[:, 0::2], 0, width - 1, out=bbox[:, 0::2])
+        numpy.clip(bbox[:, 1::2], 0, height - 1, out=bbox[:, 1::2])
+        boxes['distance'] = distance[keep][in_frustum]
+        boxes['visibility'] = visibility[in_frustum]
+        return boxes
+
+    def _camera_points(self, rows, player_transform):
+        """(N, 8, 3) box corners of the agents in camera space."""
+        if not isinstance(player_transform, Transform):
+            player_transform = Transform(player_transform)
+        world_to_camera = (player_transform * self.camera.get_unreal_transform()).inverse()
+        agent_to_camera = numpy.matmul(
+            world_to_camera.matrix,
+            transform_matrices(rows['location'], rows['rotation']))
+        local = _UNIT_CORNERS * rows['extent'][:, numpy.newaxis, :]
+        local += rows['box_offset'][:, numpy.newaxis, :]
+        return _transform_points(agent_to_camera, local)
+
+    def _visibility(self, corners, depths, depth):
+        """Fraction of the corners in the image not behind the depth buffer."""
+        far = 1000.0  # max depth in meters.
+        if isinstance(depth, sensor.Image):
+            depth = image_converter.depth_to_array(depth)
+        height, width = depth.shape
+        columns = numpy.rint(corners[:, :, 0]).astype(numpy.intp)
+        rows = numpy.rint(corners[:, :, 1]).astype(numpy.intp)
+        inside = (columns >= 0) & (columns < width) & (rows >= 0) & (rows < height)
+        numpy.clip(columns, 0, width - 1, out=columns)
+        numpy.clip(rows, 0, height - 1, out=rows)
+        buffer_depths = depth[rows, columns] * far
+        visible = inside & (buffer_depths + self.occlusion_tolerance >= depths)
+        inside_count = inside.sum(axis=1)
+        visibility = numpy.ones(len(corners), dtype=numpy.float32)
+        tested = inside_count > 0
+        visibility[tested] = visible.sum(axis=1)[tested] / inside_count[tested]
+        return visibility
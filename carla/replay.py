@@ -0,0 +1,203 @@
+# Copyright (c) 2017 Computer Vision Center (CVC) at the Universitat Autonoma de
+# Barcelona (UAB).
+#
+# This work is licensed under the terms of the MIT license.
+# For a copy, see <https://opensource.org/licenses/MIT>.
+
+"""Offline playback of the captures recorded by CarlaClient.start_capture."""
+
+import mmap
+import struct
+
+from contextlib import contextmanager
+
+from . import capture
+from . import measurements
+from . import util
+from .client import carla_protocol, _make_sensor_parsers, _SENSOR_ID
+
+try:
+    import numpy
+except ImportError:
+    raise RuntimeError('cannot import numpy, make sure numpy package is installed.')
+
+
+_INDEX_DTYPE = numpy.dtype([('offset', '<u8'), ('kind', '<u8')])
+
+
+@contextmanager
+def make_replay_carla_client(path, **kwargs):
+    """Context manager for creating and connecting a ReplayCarlaClient."""
+    with util.make_connection(ReplayCarlaClient, path, **kwargs) as client:
+        yield client
+
+
+class ReplayCarlaClient(object):
+    """
+    Drop-in replacement of CarlaClient serving "read_data" from a capture
+    file instead of a server. The capture is memory-mapped and frames are
+    parsed in place, the raw_data of the images returned are memoryviews
+    over the file.
+
+    "load_settings" ignores the settings given and returns the scene
+    description of the capture, "send_control" does nothing. Reading past
+    the last frame raises EOFError, unless loop is set, then playback starts
+    over from the first frame. A last frame truncated by an interrupted
+    capture is left out.
+
+    If lazy_measurements is set, "read_data" returns a
+    measurements.LazyMeasurements like CarlaClient does.
+    """
+
+    def __init__(self, path, loop=False, lazy_measurements=False):
+        self._path = str(path)
+        self._loop = loop
+        self._lazy_measurements = lazy_measurements
+        self._mmap = None
+        self._view = None
+        self._scenes = None
+        self._frames = None
+        self._scene_of_frame = None
+        self._sensors = {}
+        self._inactive_sensors = set()
+        self._scene_index = None
+        self._next_frame = 0
+
+    def connect(self, connection_attempts=None):
+        """Open and map the capture file."""
+        with open(self._path, 'rb') as capture_file:
+            self._mmap = mmap.mmap(capture_file.fileno(), 0, access=mmap.ACCESS_READ)
+        self._view = memoryview(self._mmap)
+        magic, version = capture.HEADER.unpack_from(self._view)
+        if magic != capture.MAGIC or version != capture.VERSION:
+            self.disconnect()
+            raise RuntimeError('%s is not a CARLA capture file' % self._path)
+        index = numpy.fromfile(capture.index_path(self._path), dtype=_INDEX_DTYPE)
+        # A record left unfinished by an interrupted capture is dropped. The
+        # file is append-only, so only the last record can be truncated.
+        index = index[index['offset'] < len(self._mmap)]
+        if len(index) and not self._is_complete(*index[-1]):
+            index = index[:-1]
+        is_scene = index['kind'] == capture.RECORD_SCENE
+        self._scenes = index['offset'][is_scene]
+        self._frames = index['offset'][~is_scene]
+        self._scene_of_frame = numpy.cumsum(is_scene)[~is_scene] - 1
+        self._scene_index = None
+
+    def disconnect(self):
+        """Unmap the capture file."""
+        if self._view is not None:
+            self._view.release()
+            self._view = None
+        if self._mmap is not None:
+            try:
+                self._mmap.close()
+            except BufferError:
+                # Sensor data still references the file, closed once collected.
+                pass
+            self._mmap = None
+
+    def connected(self):
+        """Return whether the capture file is open."""
+        return self._mmap is not None
+
+    @property
+    def frame_count(self):
+        """Number of frames in the capture."""
+        return len(self._frames)
+
+    def load_settings(self, carla_settings=None):
+        """Return the scene description of the first episode captured."""
+        return self._parse_scene(0)
+
+    def start_episode(self, player_start_index=None):
+        """Rewind playback to the first frame."""
+        self.seek(0)
+
+    def seek(self, frame_index):
+        """Make frame_index the next frame returned by "read_data"."""
+        if not 0 <= frame_index <= len(self._frames):
+            raise IndexError('frame %d out of range' % frame_index)
+        self._next_frame = frame_index
+
+    def read_data(self):
+        """
+        Read the next frame of the capture. Return a pair containing the
+        protobuf object containing the measurements followed by the raw data
+        of the sensors.
+        """
+        if self._next_frame >= len(self._frames):
+            if not self._loop or len(self._frames) == 0:
+                raise EOFError('end of capture %s' % self._path)
+            self._next_frame = 0
+        frame_index = self._next_frame
+        self._next_frame += 1
+        scene_index = self._scene_of_frame[frame_index]
+        if scene_index < 0:
+            raise RuntimeError('frame %d has no scene description' % frame_index)
+        if scene_index != self._scene_index:
+            self._parse_scene(scene_index)
+        offset = int(self._frames[frame_index])
+        data, offset = self._read_message(offset)
+        if self._lazy_measurements:
+            pb_message = measurements.LazyMeasurements(data)
+        else:
+            pb_message = carla_protocol.Measurements()
+            pb_message.ParseFromString(bytes(data))
+        sensor_data = {}
+        while True:
+            data, offset = self._read_message(offset)
+            if not data:
+                break
+            sensor_id = _SENSOR_ID.unpack_from(data)[0]
+            parser = self._sensors[sensor_id]
+            if parser.name not in self._inactive_sensors:
+                sensor_data[parser.name] = parser.parse_raw_data(data[4:])
+        return pb_message, sensor_data
+
+    def set_sensor_active(self, sensor_name, active=True):
+        """Include or leave out the data of the sensor in "read_data"."""
+        if active:
+            self._inactive_sensors.discard(sensor_name)
+        else:
+            self._inactive_sensors.add(sensor_name)
+
+    def is_sensor_active(self, sensor_name):
+        """Return whether the data of the sensor is returned by "read_data"."""
+        return sensor_name not in self._inactive_sensors
+
+    def send_control(self, *args, **kwargs):
+        """Controls cannot change a capture, they are ignored."""
+        pass
+
+    def _parse_scene(self, scene_index):
+        if len(self._scenes) <= scene_index:
+            raise RuntimeError('%s holds no scene description' % self._path)
+        data, _ = self._read_message(int(self._scenes[scene_index]))
+        pb_message = carla_protocol.SceneDescription()
+        pb_message.ParseFromString(bytes(data))
+        self._sensors = dict((s.id, s) for s in _make_sensor_parsers(pb_message.sensors))
+        self._scene_index = scene_index
+        return pb_message
+
+    def _is_complete(self, offset, kind):
+        """Return whether every message of the record at offset is in the file."""
+        try:
+            data, offset = self._read_message(int(offset))
+            if kind == capture.RECORD_FRAME:
+                # Measurements, then sensor messages up to an empty one.
+                while data:
+                    data, offset = self._read_message(offset)
+        except EOFError:
+            return False
+        return True
+
+    def _read_message(self, offset):
+        """Return the message at offset and the offset of the next one."""
+        if offset + 4 > len(self._view):
+            raise EOFError('truncated capture %s' % self._path)
+        length = struct.unpack_from('<L', self._view, offset)[0]
+        start = offset + 4
+        if start + length > len(self._view):
+            raise EOFError('truncated capture %s' % self._path)
+        return self._view[start:start + length], start + length
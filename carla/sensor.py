@@ -7,6 +7,7 @@
 """CARLA sensors."""
 
 
+import itertools
 import os
 
 from collections import namedtuple
@@ -32,10 +33,57 @@ Point = namedtuple('Point', 'x y z color')
 Point.__new__.__defaults__ = (0.0, 0.0, 0.0, None)
 
 
+_TO_UNREAL_TRANSFORM = Transform(Rotation(roll=-90, yaw=90), Scale(x=-1))
+
+
 def _append_extension(filename, ext):
     return filename if filename.lower().endswith(ext.lower()) else filename + ext
 
 
+# Point-cloud fields of the binary formats.
+_PLY_FIELDS = [
+    ('x', '<f4'), ('y', '<f4'), ('z', '<f4'),
+    ('diffuse_red', 'u1'), ('diffuse_green', 'u1'), ('diffuse_blue', 'u1')]
+_NPY_FIELDS = [
+    ('x', '<f4'), ('y', '<f4'), ('z', '<f4'),
+    ('red', 'u1'), ('green', 'u1'), ('blue', 'u1')]
+_PLY_TYPES = {'<f4': 'float32', 'u1': 'uchar'}
+_PLY_DTYPES = {
+    'float': '<f4', 'float32': '<f4', 'double': '<f8', 'float64': '<f8',
+    'uchar': 'u1', 'uint8': 'u1', 'char': 'i1', 'int8': 'i1',
+    'short': '<i2', 'int16': '<i2', 'ushort': '<u2', 'uint16': '<u2',
+    'int': '<i4', 'int32': '<i4', 'uint': '<u4', 'uint32': '<u4'}
+
+
+def _as_points(array):
+    """Points as a contiguous (n, 3) float32 array."""
+    return numpy.ascontiguousarray(array, dtype=numpy.float32)
+
+
+def _read_ply_header(ply_file):
+    """Return the format, vertex count and vertex fields of a PLY file."""
+    if ply_file.readline().strip() != b'ply':
+        raise ValueError('not a PLY file')
+    ply_format, count, fields = None, 0, []
+    for line in ply_file:
+        words = line.decode('ascii').split()
+        if not words or words[0] == 'comment':
+            continue
+        if words[0] == 'end_header':
+            break
+        if words[0] == 'format':
+            ply_format = words[1]
+        elif words[0] == 'element':
+            if words[1] != 'vertex':
+                raise ValueError('unsupported PLY element "%s"' % words[1])
+            count = int(words[2])
+        elif words[0] == 'property':
+            fields.append((words[2], _PLY_DTYPES[words[1]]))
+    if ply_format not in ('ascii', 'binary_little_endian'):
+        raise ValueError('unsupported PLY format "%s"' % ply_format)
+    return ply_format, count, fields
+
+
 # ==============================================================================
 # -- Sensor --------------------------------------------------------------------
 # ==============================================================================
@@ -55,6 +103,7 @@ class Sensor(object):
         self.RotationPitch = 0.0
         self.RotationRoll = 0.0
         self.RotationYaw = 0.0
+        self._unreal_transform = None
 
     def set(self, **kwargs):
         for key, value in kwargs.items():
@@ -87,9 +136,15 @@ class Sensor(object):
         transformation with the Unreal necessary corrections applied.
 
         @todo Do we need to expose this?
+
+        The transform is cached until the position or rotation change.
         '''
-        to_unreal_transform = Transform(Rotation(roll=-90, yaw=90), Scale(x=-1))
-        return self.get_transform() * to_unreal_transform
+        pose = (
+            self.PositionX, self.PositionY, self.PositionZ,
+            self.RotationPitch, self.RotationYaw, self.RotationRoll)
+        if self._unreal_transform is None or self._unreal_transform[0] != pose:
+            self._unreal_transform = (pose, self.get_transform() * _TO_UNREAL_TRANSFORM)
+        return self._unreal_transform[1]
 
 
 class Camera(Sensor):
@@ -136,13 +191,45 @@ class Lidar(Sensor):
 
 
 class SensorData(object):
-    """Base class for sensor data returned from the server."""
+    """
+    Base class for sensor data returned from the server.
+
+    Sensor data read through a carla.arena.FrameArena is backed by a pooled
+    buffer. Consumers that keep it past the current frame call "acquire", and
+    every consumer calls "release" once done with it. For data not backed by
+    an arena both are no-ops.
+    """
     def __init__(self, frame_number):
         self.frame_number = frame_number
+        self._buffer = None
+        self._generation = None
+
+    def acquire(self):
+        """Add a consumer to the buffer backing this data."""
+        if self._buffer is not None:
+            self._buffer.acquire(self._generation)
+        return self
+
+    def release(self):
+        """Remove a consumer from the buffer backing this data."""
+        if self._buffer is not None:
+            self._buffer.release(self._generation)
+
+    def _attach_buffer(self, buffer):
+        """Back this data by a carla.arena.FrameBuffer, at its current frame."""
+        self._buffer = buffer
+        self._generation = buffer.generation
+
+    def _check_buffer(self):
+        if self._buffer is not None:
+            self._buffer.check(self._generation)
 
 
 class Image(SensorData):
-    """Data generated by a Camera."""
+    """
+    Data generated by a Camera. The raw_data is a bytes-like object, either
+    bytes, a bytearray or a memoryview over the received buffer.
+    """
 
     def __init__(self, frame_number, width, height, image_type, fov, raw_data):
         super(Image, self).__init__(frame_number=frame_number)
@@ -151,15 +238,21 @@ class Image(SensorData):
         self.height = height
         self.type = image_type
         self.fov = fov
-        self.raw_data = raw_data
+        self._raw_data = raw_data
         self._converted_data = None
 
+    @property
+    def raw_data(self):
+        self._check_buffer()
+        return self._raw_data
+
     @property
     def data(self):
         """
         Lazy initialization for data property, stores converted data in its
         default format.
         """
+        self._check_buffer()
         if self._converted_data is None:
             from . import image_converter
 
@@ -184,7 +277,7 @@ class Image(SensorData):
         image = PImage.frombytes(
             mode='RGBA',
             size=(self.width, self.height),
-            data=self.raw_data,
+            data=bytes(self.raw_data),
             decoder_name='raw')
         color = image.split()
         image = PImage.merge("RGB", color[2::-1])
@@ -213,6 +306,7 @@ class PointCloud(SensorData):
           ...,
           [Xn,Yn,Zn] ]
         """
+        self._check_buffer()
         return self._array
 
     @property
@@ -233,48 +327,199 @@ class PointCloud(SensorData):
 
     def apply_transform(self, transformation):
         """Modify the PointCloud instance transforming its points"""
-        self._array = transformation.transform_points(self._array)
+        self._array = transformation.transform_points(self.array)
 
-    def save_to_disk(self, filename):
-        """Save this point-cloud to disk as PLY format."""
-        filename = _append_extension(filename, '.ply')
-
-        def construct_ply_header():
-            """Generates a PLY header given a total number of 3D points and
-            coloring property if specified
-            """
-            points = len(self)  # Total point number
-            header = ['ply',
-                      'format ascii 1.0',
-                      'element vertex {}',
-                      'property float32 x',
-                      'property float32 y',
-                      'property float32 z',
-                      'property uchar diffuse_red',
-                      'property uchar diffuse_green',
-                      'property uchar diffuse_blue',
-                      'end_header']
-            if not self._has_colors:
-                return '\n'.join(header[0:6] + [header[-1]]).format(points)
-            return '\n'.join(header).format(points)
+    def crop_range(self, max_range, min_range=0.0):
+        """
+        Return a PointCloud with the points whose distance to the origin is
+        between min_range and max_range.
+        """
+        points = self.array
+        squared_range = numpy.einsum('ij,ij->i', points, points)
+        mask = squared_range <= max_range * max_range
+        if min_range > 0.0:
+            mask &= squared_range >= min_range * min_range
+        return self._select(mask)
+
+    def crop_box(self, min_bound, max_bound):
+        """
+        Return a PointCloud with the points inside the axis-aligned box
+        between the (x, y, z) corners min_bound and max_bound.
+        """
+        mask = numpy.ones(len(self.array), dtype=bool)
+        for axis in range(3):
+            coordinates = self.array[:, axis]
+            mask &= coordinates >= min_bound[axis]
+            mask &= coordinates <= max_bound[axis]
+        return self._select(mask)
+
+    def remove_ground(self, ground_height):
+        """
+        Return a PointCloud without the points at or below ground_height. The
+        z axis must point up, e.g. once transformed to the vehicle frame.
+        """
+        return self._select(self.array[:, 2] > ground_height)
+
+    def voxel_downsample(self, voxel_size):
+        """
+        Return a PointCloud with one point per occupied cubic voxel of side
+        voxel_size, the centroid of the points (and their mean color) in it.
+        """
+        points = self.array
+        if len(points) == 0:
+            return self._select(numpy.zeros(0, dtype=bool))
+        cells = numpy.floor(points / numpy.float32(voxel_size)).astype(numpy.int64)
+        # Pack the voxel coordinates in one key, 21 bits per axis.
+        cells += 1 << 20
+        keys = (cells[:, 0] << 42) | (cells[:, 1] << 21) | cells[:, 2]
+        # Number the voxels by sorting their keys.
+        order = numpy.argsort(keys)
+        keys = keys[order]
+        first = numpy.empty(len(keys), dtype=bool)
+        first[0] = True
+        numpy.not_equal(keys[1:], keys[:-1], out=first[1:])
+        voxels = numpy.empty(len(keys), dtype=numpy.intp)
+        voxels[order] = numpy.cumsum(first) - 1
+        counts = numpy.bincount(voxels)
+
+        def mean(array, dtype):
+            result = numpy.empty((len(counts), 3), dtype=dtype)
+            for i in range(3):
+                result[:, i] = numpy.bincount(voxels, weights=array[:, i]) / counts
+            return result
+
+        color_array = None
+        if self._has_colors:
+            color_array = mean(self._color_array, self._color_array.dtype)
+        return PointCloud(self.frame_number, mean(points, numpy.float32), color_array=color_array)
+
+    @staticmethod
+    def merge(clouds, frame_number=None):
+        """
+        Return a PointCloud with the points of several PointClouds or
+        LidarMeasurements. Colors are kept if every cloud has them. The frame
+        number defaults to the latest one of the clouds.
+        """
+        clouds = [getattr(c, 'point_cloud', c) for c in clouds]
+        if frame_number is None:
+            frame_number = max(c.frame_number for c in clouds) if clouds else 0
+        points = numpy.concatenate(
+            [numpy.reshape(c.array, (-1, 3)) for c in clouds] or [numpy.zeros((0, 3))])
+        color_array = None
+        if clouds and all(c.has_colors() for c in clouds):
+            color_array = numpy.concatenate([c.color_array for c in clouds])
+        return PointCloud(frame_number, _as_points(points), color_array=color_array)
+
+    def _select(self, mask):
+        """New PointCloud with the points selected by the boolean mask."""
+        color_array = None
+        if self._has_colors:
+            color_array = numpy.compress(mask, self._color_array, axis=0)
+        return PointCloud(
+            self.frame_number,
+            _as_points(numpy.compress(mask, self.array, axis=0)),
+            color_array=color_array)
+
+    def save_to_disk(self, filename, format='ascii'):
+        """
+        Save this point-cloud to disk. The format is either a PLY file,
+        'ascii' or 'binary_little_endian', or 'npy': a NumPy file holding the
+        (n, 3) float32 points, or a structured array with fields x, y, z,
+        red, green and blue if the points have colors.
+        """
+        if format not in ('ascii', 'binary_little_endian', 'npy'):
+            raise ValueError('unknown point-cloud format "%s"' % format)
+        filename = _append_extension(filename, '.npy' if format == 'npy' else '.ply')
 
+        # Create folder to save if does not exist.
+        folder = os.path.dirname(filename)
+        if folder and not os.path.isdir(folder):
+            os.makedirs(folder)
+
+        if format == 'npy':
+            if self._has_colors:
+                array = self._to_structured_array(_NPY_FIELDS)
+            else:
+                array = numpy.ascontiguousarray(self.array, dtype=numpy.float32)
+            numpy.save(filename, array)
+        elif format == 'binary_little_endian':
+            array = self._to_structured_array(_PLY_FIELDS)
+            with open(filename, 'wb') as ply_file:
+                ply_file.write(self._ply_header(format).encode('ascii'))
+                ply_file.write(array.tobytes())
+        else:
+            self._save_ascii_ply(filename)
+
+    @staticmethod
+    def load_from_disk(filename, frame_number=0):
+        """
+        Load a point-cloud saved by "save_to_disk" in any of its formats.
+        """
+        if filename.lower().endswith('.npy'):
+            array = numpy.load(filename)
+            if array.dtype.names is None:
+                return PointCloud(frame_number, array)
+            return PointCloud._from_structured_array(frame_number, array)
+        with open(filename, 'rb') as ply_file:
+            ply_format, count, fields = _read_ply_header(ply_file)
+            if ply_format == 'binary_little_endian':
+                array = numpy.fromfile(ply_file, dtype=numpy.dtype(fields), count=count)
+            else:
+                # Only the "count" vertex lines, loadtxt has no max_rows before
+                # numpy 1.16.
+                columns = numpy.loadtxt(
+                    itertools.islice(ply_file, count), dtype=numpy.float32, ndmin=2)
+                array = numpy.empty(len(columns), dtype=numpy.dtype(fields))
+                for index, (name, _) in enumerate(fields):
+                    array[name] = columns[:, index]
+        return PointCloud._from_structured_array(frame_number, array)
+
+    @staticmethod
+    def _from_structured_array(frame_number, array):
+        names = array.dtype.names
+        points = numpy.empty((len(array), 3), dtype=numpy.float32)
+        for index, name in enumerate(names[:3]):
+            points[:, index] = array[name]
+        if len(names) < 6:
+            return PointCloud(frame_number, points)
+        colors = numpy.empty((len(array), 3), dtype=numpy.uint8)
+        for index, name in enumerate(names[3:6]):
+            colors[:, index] = array[name]
+        return PointCloud(frame_number, points, color_array=colors)
+
+    def _to_structured_array(self, fields):
+        fields = fields if self._has_colors else fields[:3]
+        array = numpy.empty(len(self.array), dtype=numpy.dtype(fields))
+        for index, (name, _) in enumerate(fields[:3]):
+            array[name] = self.array[:, index]
+        for index, (name, _) in enumerate(fields[3:]):
+            array[name] = self._color_array[:, index]
+        return array
+
+    def _ply_header(self, format):
+        """Generates a PLY header given a total number of 3D points and
+        coloring property if specified
+        """
+        header = ['ply', 'format {} 1.0'.format(format), 'element vertex {}'.format(len(self))]
+        fields = _PLY_FIELDS if self._has_colors else _PLY_FIELDS[:3]
+        for name, dtype in fields:
+            header.append('property {} {}'.format(_PLY_TYPES[dtype], name))
+        header.append('end_header')
+        return '\n'.join(header) + '\n'
+
+    def _save_ascii_ply(self, filename):
         if not self._has_colors:
             ply = '\n'.join(['{:.2f} {:.2f} {:.2f}'.format(
-                *p) for p in self._array.tolist()])
+                *p) for p in self.array.tolist()])
         else:
             points_3d = numpy.concatenate(
-                (self._array, self._color_array), axis=1)
+                (self.array, self._color_array), axis=1)
             ply = '\n'.join(['{:.2f} {:.2f} {:.2f} {:.0f} {:.0f} {:.0f}'
                              .format(*p) for p in points_3d.tolist()])
 
-        # Create folder to save if does not exist.
-        folder = os.path.dirname(filename)
-        if not os.path.isdir(folder):
-            os.makedirs(folder)
-
         # Open the file and save with the specific PLY format.
         with open(filename, 'w+') as ply_file:
-            ply_file.write('\n'.join([construct_ply_header(), ply]))
+            ply_file.write(self._ply_header('ascii') + ply)
 
     def __len__(self):
         return len(self.array)
@@ -282,7 +527,7 @@ class PointCloud(SensorData):
     def __getitem__(self, key):
         color = None if self._color_array is None else Color(
             *self._color_array[key])
-        return Point(*self._array[key], color=color)
+        return Point(*self.array[key], color=color)
 
     def __iter__(self):
         class PointIterator(object):
@@ -316,7 +561,13 @@ class LidarMeasurement(SensorData):
         self.horizontal_angle = horizontal_angle
         self.channels = channels
         self.point_count_by_channel = point_count_by_channel
-        self.point_cloud = point_cloud
+        self._point_cloud = point_cloud
+
+    @property
+    def point_cloud(self):
+        """The PointCloud of the measurement."""
+        self._check_buffer()
+        return self._point_cloud
 
     @property
     def data(self):
@@ -329,6 +580,10 @@ class LidarMeasurement(SensorData):
         """
         return self.point_cloud.array
 
-    def save_to_disk(self, filename):
-        """Save point-cloud to disk as PLY format."""
-        self.point_cloud.save_to_disk(filename)
+    def save_to_disk(self, filename, format='ascii'):
+        """Save point-cloud to disk, see PointCloud.save_to_disk."""
+        self.point_cloud.save_to_disk(filename, format)
+
+    def _attach_buffer(self, buffer):
+        super(LidarMeasurement, self)._attach_buffer(buffer)
+        self._point_cloud._attach_buffer(buffer)
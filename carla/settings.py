@@ -72,6 +72,10 @@ class CarlaSettings(object):
             raise ValueError('Sensor not supported')
         self._sensors.append(sensor)
 
+    def get_sensors(self):
+        """Return the sensors added to the player vehicle."""
+        return list(self._sensors)
+
     def __str__(self):
         """Converts this object to an INI formatted string."""
         ini = ConfigParser()
@@ -11,6 +11,9 @@ import socket
 import struct
 import time
 
+_SCRATCH_SIZE = 256 * 1024
+
+
 class TCPConnectionError(Exception):
     pass
 
@@ -22,13 +25,24 @@ class TCPClient(object):
 
     Received messages are expected to be prepended by a int32 defining the
     message size. Messages are sent following this convention.
+
+    Each message is received directly into a bytearray allocated to its exact
+    size and returned without further copies. If zero_copy is set it is
+    returned as a memoryview over that bytearray, so slicing the result never
+    copies the payload either.
+
+    A capture, any object with a "write" method, can be set to receive every
+    byte read from the socket (see "set_capture").
     """
 
-    def __init__(self, host, port, timeout):
+    def __init__(self, host, port, timeout, zero_copy=False):
         self._host = host
         self._port = port
         self._timeout = timeout
+        self._zero_copy = zero_copy
         self._socket = None
+        self._capture = None
+        self._scratch = None
         self._logprefix = '(%s:%s) ' % (self._host, self._port)
 
     def connect(self, connection_attempts=10):
@@ -58,6 +72,10 @@ class TCPClient(object):
         """Return whether there is an active connection."""
         return self._socket is not None
 
+    def set_capture(self, capture):
+        """Write every byte read from now on to capture, None stops it."""
+        self._capture = capture
+
     def write(self, message):
         """Send message to the server."""
         if self._socket is None:
@@ -70,28 +88,63 @@ class TCPClient(object):
 
     def read(self):
         """Read a message from the server."""
+        length = self.read_header()
+        data = self._read_n(length)
+        return data
+
+    def read_header(self):
+        """
+        Read the size prefix of the next message. The message itself must
+        then be consumed with "read_into".
+        """
         header = self._read_n(4)
         if not header:
             raise TCPConnectionError(self._logprefix + 'connection closed')
-        length = struct.unpack('<L', header)[0]
-        data = self._read_n(length)
-        return data
+        return struct.unpack('<L', header)[0]
+
+    def read_into(self, buffer):
+        """Read len(buffer) bytes of the current message into buffer."""
+        self._read_into(memoryview(buffer))
+
+    def read_body(self, length):
+        """Read the next length bytes of the current message."""
+        return self._read_n(length)
+
+    def skip(self, length):
+        """
+        Discard the next length bytes of the current message, reading them
+        into a reusable scratch buffer.
+        """
+        if self._scratch is None:
+            self._scratch = memoryview(bytearray(_SCRATCH_SIZE))
+        while length > 0:
+            chunk = min(length, _SCRATCH_SIZE)
+            self._read_into(self._scratch[:chunk])
+            length -= chunk
 
     def _read_n(self, length):
         """Read n bytes from the socket."""
+        buf = bytearray(length)
+        view = memoryview(buf)
+        self._read_into(view)
+        return view if self._zero_copy else buf
+
+    def _read_into(self, view):
+        """Fill the writable memoryview with bytes read from the socket."""
         if self._socket is None:
             raise TCPConnectionError(self._logprefix + 'not connected')
-        buf = bytes()
-        while length > 0:
+        offset = 0
+        length = len(view)
+        while offset < length:
             try:
-                data = self._socket.recv(length)
+                received = self._socket.recv_into(view[offset:], length - offset)
             except socket.error as exception:
                 self._reraise_exception_as_tcp_error('failed to read data', exception)
-            if not data:
+            if not received:
                 raise TCPConnectionError(self._logprefix + 'connection closed')
-            buf += data
-            length -= len(data)
-        return buf
+            offset += received
+        if self._capture is not None:
+            self._capture.write(view)
 
     def _reraise_exception_as_tcp_error(self, message, exception):
         raise TCPConnectionError('%s%s: %s' % (self._logprefix, message, exception))
@@ -4,8 +4,6 @@
 # This work is licensed under the terms of the MIT license.
 # For a copy, see <https://opensource.org/licenses/MIT>.
 
-import math
-
 from collections import namedtuple
 
 try:
@@ -31,15 +29,55 @@ Scale = namedtuple('Scale', 'x y z')
 Scale.__new__.__defaults__ = (1.0, 1.0, 1.0)
 
 
+def transform_matrices(locations, rotations=None, scales=None):
+    """
+    Build a (N, 4, 4) stack of transformation matrices from (N, 3) arrays of
+    locations (x, y, z), rotations in degrees (pitch, yaw, roll) and scales
+    (x, y, z). Missing rotations are zero and missing scales are one.
+    """
+    locations = numpy.asarray(locations, dtype=numpy.float64).reshape(-1, 3)
+    count = len(locations)
+    matrices = numpy.zeros((count, 4, 4))
+    matrices[:, 3, 3] = 1.0
+    matrices[:, 0:3, 3] = locations
+    if rotations is None:
+        rotations = numpy.zeros((count, 3))
+    radians = numpy.radians(numpy.asarray(rotations, dtype=numpy.float64).reshape(-1, 3))
+    cp, cy, cr = numpy.cos(radians).T
+    sp, sy, sr = numpy.sin(radians).T
+    if scales is None:
+        scales = numpy.ones((count, 3))
+    scale_x, scale_y, scale_z = numpy.asarray(scales, dtype=numpy.float64).reshape(-1, 3).T
+    matrices[:, 0, 0] = scale_x * (cp * cy)
+    matrices[:, 0, 1] = scale_y * (cy * sp * sr - sy * cr)
+    matrices[:, 0, 2] = -scale_z * (cy * sp * cr + sy * sr)
+    matrices[:, 1, 0] = scale_x * (sy * cp)
+    matrices[:, 1, 1] = scale_y * (sy * sp * sr + cy * cr)
+    matrices[:, 1, 2] = scale_z * (cy * sr - sy * sp * cr)
+    matrices[:, 2, 0] = scale_x * (sp)
+    matrices[:, 2, 1] = -scale_y * (cp * sr)
+    matrices[:, 2, 2] = scale_z * (cp * cr)
+    return matrices
+
+
+def _transform_points(matrices, points):
+    """Apply (..., 4, 4) matrices to (..., n, 3) points: p * R^T + t."""
+    points = numpy.asarray(points)
+    result = numpy.matmul(points, numpy.swapaxes(matrices[..., 0:3, 0:3], -1, -2))
+    result += matrices[..., numpy.newaxis, 0:3, 3]
+    return result
+
+
 class Transform(object):
     """A 3D transformation.
 
     The transformation is applied in the order: scale, rotation, translation.
+    The matrix is a 4x4 numpy.ndarray.
     """
 
     def __init__(self, *args, **kwargs):
         if 'matrix' in kwargs:
-            self.matrix = kwargs['matrix']
+            self.matrix = numpy.asarray(kwargs['matrix'], dtype=numpy.float64)
             return
         if isinstance(args[0], carla_protocol.Transform):
             args = [
@@ -52,7 +90,7 @@ class Transform(object):
                     args[0].rotation.yaw,
                     args[0].rotation.roll)
             ]
-        self.matrix = numpy.matrix(numpy.identity(4))
+        self.matrix = numpy.identity(4)
         self.set(*args, **kwargs)
 
     def set(self, *args):
@@ -92,24 +130,10 @@ class Transform(object):
                     'Translation', 'Rotation' or 'Scale'")
 
         # Transformation matrix
-        cy = math.cos(numpy.radians(rotation.yaw))
-        sy = math.sin(numpy.radians(rotation.yaw))
-        cr = math.cos(numpy.radians(rotation.roll))
-        sr = math.sin(numpy.radians(rotation.roll))
-        cp = math.cos(numpy.radians(rotation.pitch))
-        sp = math.sin(numpy.radians(rotation.pitch))
-        self.matrix[0, 3] = translation.x
-        self.matrix[1, 3] = translation.y
-        self.matrix[2, 3] = translation.z
-        self.matrix[0, 0] = scale.x * (cp * cy)
-        self.matrix[0, 1] = scale.y * (cy * sp * sr - sy * cr)
-        self.matrix[0, 2] = -scale.z * (cy * sp * cr + sy * sr)
-        self.matrix[1, 0] = scale.x * (sy * cp)
-        self.matrix[1, 1] = scale.y * (sy * sp * sr + cy * cr)
-        self.matrix[1, 2] = scale.z * (cy * sr - sy * sp * cr)
-        self.matrix[2, 0] = scale.x * (sp)
-        self.matrix[2, 1] = -scale.y * (cp * sr)
-        self.matrix[2, 2] = scale.z * (cp * cr)
+        self.matrix = transform_matrices(
+            [translation],
+            [(rotation.pitch, rotation.yaw, rotation.roll)],
+            [scale])[0]
 
     def inverse(self):
         """Return the inverse transform."""
@@ -118,20 +142,61 @@ class Transform(object):
     def transform_points(self, points):
         """
         Given a 4x4 transformation matrix, transform an array of 3D points.
-        Expected point foramt: [[X0,Y0,Z0],..[Xn,Yn,Zn]]
+        Expected point format: [[X0,Y0,Z0],..[Xn,Yn,Zn]]
         """
-        # Needed foramt: [[X0,..Xn],[Z0,..Zn],[Z0,..Zn]]. So let's transpose
-        # the point matrix.
-        points = points.transpose()
-        # Add 0s row: [[X0..,Xn],[Y0..,Yn],[Z0..,Zn],[0,..0]]
-        points = numpy.append(points, numpy.ones((1, points.shape[1])), axis=0)
-        # Point transformation
-        points = self.matrix * points
-        # Return all but last row
-        return points[0:3].transpose()
+        return _transform_points(self.matrix, points)
 
     def __mul__(self, other):
+        if isinstance(other, Transforms):
+            return Transforms(numpy.matmul(self.matrix, other.matrices))
         return Transform(matrix=numpy.dot(self.matrix, other.matrix))
 
     def __str__(self):
         return str(self.matrix)
+
+
+class Transforms(object):
+    """A stack of N 3D transformations, held in a (N, 4, 4) numpy.ndarray.
+
+    Compose with "*" (element-wise, or broadcasting a single Transform),
+    invert and transform points for all the transformations at once.
+    """
+
+    def __init__(self, matrices):
+        self.matrices = numpy.asarray(matrices, dtype=numpy.float64).reshape(-1, 4, 4)
+
+    @classmethod
+    def from_arrays(cls, locations, rotations=None, scales=None):
+        """
+        Build the transformations from (N, 3) arrays of locations, rotations
+        (pitch, yaw, roll in degrees) and scales, see "transform_matrices".
+        """
+        return cls(transform_matrices(locations, rotations, scales))
+
+    def inverse(self):
+        """Return the inverse transformations."""
+        return Transforms(numpy.linalg.inv(self.matrices))
+
+    def transform_points(self, points):
+        """
+        Transform an array of 3D points by every transformation. Points are
+        either (n, 3), returning (N, n, 3), or (N, n, 3), one set per
+        transformation.
+        """
+        return _transform_points(self.matrices, points)
+
+    def __mul__(self, other):
+        other = other.matrix if isinstance(other, Transform) else other.matrices
+        return Transforms(numpy.matmul(self.matrices, other))
+
+    def __len__(self):
+        return len(self.matrices)
+
+    def __getitem__(self, index):
+        return Transform(matrix=self.matrices[index])
+
+    def __iter__(self):
+        return (Transform(matrix=matrix) for matrix in self.matrices)
+
+    def __str__(self):
+        return str(self.matrices)
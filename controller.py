@@ -6,23 +6,51 @@ import time
 import argparse
 import logging
 import configparser
+from functools import partial
 from pathlib import Path
-import pandas as pd
-import pygame
-import pygame.locals as pl
 import numpy as np
+from carla.arena import FrameArena
 from carla.client import make_carla_client, VehicleControl
+from carla.measurements import decode_non_player_agents
+from carla.projection import BoxProjector
 from carla import sensor
 from carla.settings import CarlaSettings
 from carla.tcp import TCPConnectionError
 from carla import image_converter as ic
 from timer import Timer
+from driving_history import DrivingHistory
+from lidar_log import encode_sweep
 
-from disk_writer import ImageWriter, VideoWriter
-from HUD import InfoBox
+from disk_writer import EpisodeRecorder, VideoWriter
 from enums import GameState, HighLevelCommand, TrafficLight
 from non_player_objects import NonPlayerObjects
-from drive_models import CNNKeras, LSTMKeras
+
+DATASET_CAMERAS = (
+    "RGBCameraCenter",
+    "RGBCameraLeft",
+    "RGBCameraRight",
+    "DepthCamera",
+    "SemSegCamera",
+)
+
+# pygame and the HUD are only imported by the interactive mode, see
+# _import_pygame.
+pygame = None
+pl = None
+InfoBox = None
+
+# Conversion of the compact recorded camera frames to the images written.
+IMAGE_ENCODERS = {
+    "depth": partial(ic.packed_depth_to_logarithmic_uint8, channels=3),
+    "sem_seg": ic.label_array_to_cityscapes_palette,
+}
+
+
+def _import_pygame():
+    global pygame, pl, InfoBox
+    import pygame
+    import pygame.locals as pl
+    from HUD import InfoBox
 
 
 class CarlaController:
@@ -34,11 +62,11 @@ class CarlaController:
         self._game_image_3p = None
         self._measurements = None
         self._sensor_data = None
-        self._image_history = None
+        self._box_projector = None
+        self._agents = None
         self._driving_history = None
         self._video_images = None
         self._video_info = None
-        self._frame_history = None
         self._pygame_display = None
         self._carla_settings = None
         self._settings = self._initialize_settings(settings)
@@ -56,9 +84,13 @@ class CarlaController:
         self._drive_model_path = args.drive_model_path
         self._drive_model = None
         self._disk_writer_thread = None
-        self._bottom_left_hud = InfoBox((200, 75))
-        self._bottom_right_hud = InfoBox((250, 75))
-        self._top_right_hud = InfoBox((200, 25))
+        self._recorder = None
+        self._last_recorder = None
+        self._closed_recorders = []
+        self._headless = args.headless
+        self._bottom_left_hud = None
+        self._bottom_right_hud = None
+        self._top_right_hud = None
         self._current_traffic_light = None
         self._current_speed_limit = None
         self._current_hlc = None
@@ -95,6 +127,16 @@ class CarlaController:
         )
         s["frame_limit"] = int(f.get("Controller", "FrameLimit", fallback=0))
         s["episode_limit"] = int(f.get("Controller", "EpisodeLimit", fallback=0))
+        s["writer_queue_size"] = int(
+            f.get("Controller", "WriterQueueSize", fallback=32)
+        )
+        s["writer_threads"] = int(f.get("Controller", "WriterThreads", fallback=2))
+        s["hlc_look_back"] = float(f.get("Controller", "HLCLookBack", fallback=70))
+        s["hlc_look_back_unit"] = f.get(
+            "Controller", "HLCLookBackUnit", fallback="frames"
+        )
+        if s["hlc_look_back_unit"] not in ("frames", "seconds"):
+            raise ValueError("HLCLookBackUnit must be either frames or seconds")
         s["drive_model_steer"] = f.getboolean(
             "DriveModel", "ControlSteer", fallback=False
         )
@@ -105,12 +147,38 @@ class CarlaController:
             "DriveModel", "ControlBrake", fallback=False
         )
         s["starting_positions"] = f.get("Carla", "StartingPositions", fallback=None)
+        s["lidar_enabled"] = f.getboolean("Lidar", "Enabled", fallback=False)
+        s["lidar_channels"] = int(f.get("Lidar", "Channels", fallback=32))
+        s["lidar_range"] = float(f.get("Lidar", "Range", fallback=50))
+        s["lidar_points_per_second"] = int(
+            f.get("Lidar", "PointsPerSecond", fallback=56000)
+        )
+        s["lidar_rotation_frequency"] = float(
+            f.get("Lidar", "RotationFrequency", fallback=10)
+        )
+        s["lidar_upper_fov_limit"] = float(f.get("Lidar", "UpperFovLimit", fallback=10))
+        s["lidar_lower_fov_limit"] = float(
+            f.get("Lidar", "LowerFovLimit", fallback=-30)
+        )
+        s["lidar_resolution"] = float(f.get("Lidar", "Resolution", fallback=0.01))
+        s["bounding_boxes_enabled"] = f.getboolean(
+            "BoundingBoxes", "Enabled", fallback=False
+        )
+        s["bounding_boxes_max_distance"] = float(
+            f.get("BoundingBoxes", "MaxDistance", fallback=100)
+        )
+        s["bounding_boxes_occlusion_tolerance"] = float(
+            f.get("BoundingBoxes", "OcclusionTolerance", fallback=1.0)
+        )
 
         if s["starting_positions"] is not None:
             s["starting_positions"] = list(map(int, s["starting_positions"].split(",")))
         return s
 
     def _initialize_pygame(self):
+        self._bottom_left_hud = InfoBox((200, 75))
+        self._bottom_right_hud = InfoBox((250, 75))
+        self._top_right_hud = InfoBox((200, 25))
         self._pygame_display = pygame.display.set_mode(
             (self._settings["window_width"], self._settings["window_height"]),
             pygame.HWSURFACE | pygame.DOUBLEBUF,
@@ -143,22 +211,23 @@ class CarlaController:
         output_image_width = self._settings["output_image_width"]
         output_image_height = self._settings["output_image_height"]
 
-        # Add a game camera 1 and 2
-        game_camera = sensor.Camera("GameCamera")
-        game_camera.set_image_size(
-            self._settings["window_width"], self._settings["window_height"]
-        )
-        game_camera.set_position(2.0, 0.0, 1.4)
-        game_camera.set_rotation(0.0, 0.0, 0.0)
-        settings.add_sensor(game_camera)
-
-        game_camera_3p = sensor.Camera("GameCamera3p")
-        game_camera_3p.set_image_size(
-            self._settings["window_width"], self._settings["window_height"]
-        )
-        game_camera_3p.set_position(-5, 0.0, 3)
-        game_camera_3p.set_rotation(-15, 0.0, 0)
-        settings.add_sensor(game_camera_3p)
+        # Add a game camera 1 and 2, only displayed in the interactive mode
+        if not self._headless:
+            game_camera = sensor.Camera("GameCamera")
+            game_camera.set_image_size(
+                self._settings["window_width"], self._settings["window_height"]
+            )
+            game_camera.set_position(2.0, 0.0, 1.4)
+            game_camera.set_rotation(0.0, 0.0, 0.0)
+            settings.add_sensor(game_camera)
+
+            game_camera_3p = sensor.Camera("GameCamera3p")
+            game_camera_3p.set_image_size(
+                self._settings["window_width"], self._settings["window_height"]
+            )
+            game_camera_3p.set_position(-5, 0.0, 3)
+            game_camera_3p.set_rotation(-15, 0.0, 0)
+            settings.add_sensor(game_camera_3p)
 
         # Add RGB center camera
         rgb_camera_center = sensor.Camera("RGBCameraCenter")
@@ -167,6 +236,15 @@ class CarlaController:
         rgb_camera_center.set_rotation(0.0, 0.0, 0.0)
         settings.add_sensor(rgb_camera_center)
 
+        if self._settings["bounding_boxes_enabled"]:
+            self._box_projector = BoxProjector(
+                rgb_camera_center,
+                max_distance=self._settings["bounding_boxes_max_distance"],
+                occlusion_tolerance=self._settings[
+                    "bounding_boxes_occlusion_tolerance"
+                ],
+            )
+
         # Add RGB left camera
         rgb_camera_left = sensor.Camera("RGBCameraLeft")
         rgb_camera_left.set_image_size(output_image_width, output_image_height)
@@ -197,39 +275,39 @@ class CarlaController:
         sem_seg_camera.set_rotation(0.0, 0.0, 0.0)
         settings.add_sensor(sem_seg_camera)
 
+        # Add lidar
+        if self._settings["lidar_enabled"]:
+            lidar = sensor.Lidar(
+                "Lidar",
+                Channels=self._settings["lidar_channels"],
+                Range=self._settings["lidar_range"],
+                PointsPerSecond=self._settings["lidar_points_per_second"],
+                RotationFrequency=self._settings["lidar_rotation_frequency"],
+                UpperFovLimit=self._settings["lidar_upper_fov_limit"],
+                LowerFovLimit=self._settings["lidar_lower_fov_limit"],
+            )
+            lidar.set_position(0.0, 0.0, 2.5)
+            lidar.set_rotation(0.0, 0.0, 0.0)
+            settings.add_sensor(lidar)
+
         self._carla_settings = settings
 
         logging.debug("Carla initialized")
 
     def _initialize_drive_model(self):
         if self._drive_model_path:
+            from drive_models import CNNKeras
+
             self._drive_model = CNNKeras()
             logging.info("Loading drive model from: %s", self._drive_model_path)
             self._drive_model.load_model(self._drive_model_path)
 
     def _initialize_history(self):
-        self._driving_history = pd.DataFrame(
-            columns=[
-                "CenterRGB",
-                "LeftRGB",
-                "RightRGB",
-                "Depth",
-                "SemSeg",
-                "Location",
-                "Speed",
-                "Controls",
-                "APControls",
-                "HLC",
-                "SpeedLimit",
-                "TrafficLight",
-                "AutoPilotEnabled",
-                "WeatherID",
-            ]
-        )
-        self._image_history = []
-        self._frame_history = []
+        self._driving_history = DrivingHistory(lidar=self._settings["lidar_enabled"])
 
     def _on_new_episode(self):
+        self._log_episode_fps()
+        self._report_recorder_errors()
         self._timer.new_episode()
         if self._settings["episode_limit"] != 0:
             if self._settings["episode_limit"] < self._timer.episode_num:
@@ -265,6 +343,33 @@ class CarlaController:
         if self._drive_model:
             self._current_hlc = HighLevelCommand.FOLLOW_ROAD
 
+    def _report_recorder_errors(self, wait=False):
+        """ Log the recordings written with errors, waiting for them if wait """
+        pending = []
+        for recorder in self._closed_recorders:
+            if wait:
+                recorder.join()
+            elif not recorder.done():
+                pending.append(recorder)
+                continue
+            if recorder.error is not None:
+                logging.error(
+                    "Some frames of %s could not be written: %s",
+                    recorder.episode_path,
+                    recorder.error,
+                )
+        self._closed_recorders = pending
+
+    def _log_episode_fps(self):
+        if self._timer.episode_num > 0:
+            logging.info(
+                "Episode %d: %d frames, %.1f frames/s (%s)",
+                self._timer.episode_num,
+                self._timer.episode_frame,
+                self._timer.episode_fps(),
+                "headless" if self._headless else "interactive",
+            )
+
     def _get_keyboard_control(self, keys):
         control = VehicleControl()
         if keys[pl.K_LEFT] or keys[pl.K_a]:
@@ -328,11 +433,9 @@ class CarlaController:
         return control
 
     def _writeback_hlc_to_history(self, command):
-        look_back = 70
-        for i, row in self._driving_history.iterrows():
-            if int(row["HLC"]) == 0:
-                if i >= len(self._driving_history.index) - look_back:
-                    self._driving_history.at[i, "HLC"] = command.value
+        unit = self._settings["hlc_look_back_unit"]
+        look_back = {unit: self._settings["hlc_look_back"]}
+        self._driving_history.backfill("hlc", command.value, **look_back)
 
     def _handle_keydown_event(self, key):
         if self._game_state is not GameState.WRITING:
@@ -346,8 +449,8 @@ class CarlaController:
                 self._vehicle_in_reverse = not self._vehicle_in_reverse
             elif key == pl.K_e:
                 if self._game_state == GameState.RECORDING:
-                    self._game_state = GameState.WRITING
                     if self._record_video:
+                        self._game_state = GameState.WRITING
                         self._write_video_to_disk(
                             on_complete=self._write_history_to_disk
                         )
@@ -366,7 +469,6 @@ class CarlaController:
                 ):
                     self._game_state = GameState.RECORDING
                 elif self._game_state == GameState.RECORDING:
-                    self._game_state = GameState.WRITING
                     self._write_history_to_disk()
         if self._game_state == GameState.RECORDING:
             if key == pl.K_KP8:
@@ -452,18 +554,20 @@ class CarlaController:
         self._pygame_display.blit(surface, (0, 0))
 
     def _get_camera_images(self):
+        # Compact copies of the camera frames, converted to the images written
+        # to disk by the recorder's workers, see IMAGE_ENCODERS.
         sensor_data = self._sensor_data
 
         image_object = {
-            "rgb_center": ic.to_bgra_array(sensor_data.get("RGBCameraCenter", None)),
-            "rgb_left": ic.to_bgra_array(sensor_data.get("RGBCameraLeft", None)),
-            "rgb_right": ic.to_bgra_array(sensor_data.get("RGBCameraRight", None)),
-            "depth": ic.depth_to_logarithmic_grayscale(
-                sensor_data.get("DepthCamera", None)
-            ),
-            "sem_seg": ic.labels_to_cityscapes_palette(
-                sensor_data.get("SemSegCamera", None)
-            ),
+            "rgb_center": ic.to_bgra_array(
+                sensor_data.get("RGBCameraCenter", None)
+            ).copy(),
+            "rgb_left": ic.to_bgra_array(sensor_data.get("RGBCameraLeft", None)).copy(),
+            "rgb_right": ic.to_bgra_array(
+                sensor_data.get("RGBCameraRight", None)
+            ).copy(),
+            "depth": ic.depth_to_packed_array(sensor_data.get("DepthCamera", None)),
+            "sem_seg": ic.labels_to_array(sensor_data.get("SemSegCamera", None)).copy(),
         }
         return image_object
 
@@ -477,64 +581,94 @@ class CarlaController:
         )
         info = [speed, speed_limit, traffic_light, current_hlc]
         self._video_info.append(info)
-        self._video_images[0].append(ic.to_rgb_array(self._game_image))
-        self._video_images[1].append(ic.to_rgb_array(self._game_image_3p))
+        self._video_images[0].append(ic.to_rgb_array(self._game_image).copy())
+        self._video_images[1].append(ic.to_rgb_array(self._game_image_3p).copy())
+
+    def _update_sensor_subscriptions(self):
+        # Cameras nobody reads this frame are drained without being decoded.
+        self.client.set_sensor_active("GameCamera3p", self._record_video)
+        dataset_cameras_active = self._game_state == GameState.RECORDING or (
+            self._drive_model is not None and self._drive_model_enabled
+        )
+        for name in DATASET_CAMERAS:
+            self.client.set_sensor_active(name, dataset_cameras_active)
+        self.client.set_sensor_active("Lidar", self._game_state == GameState.RECORDING)
+
+    def _release_sensor_data(self):
+        # Sensor data is backed by the client's frame arena, hand the buffers
+        # back once the next frame is about to be read.
+        if self._sensor_data is not None:
+            for data in self._sensor_data.values():
+                data.release()
+            self._sensor_data = None
 
     def _save_to_history(self, control):
         measurements = self._measurements
 
         frame = self._timer.episode_frame
 
-        self._image_history.append(self._get_camera_images())
-        self._frame_history.append(frame)
+        if self._recorder is None:
+            path = Path(f"{self._output_path}/{self._timer.episode_timestamp_str}")
+            self._recorder = EpisodeRecorder(
+                path,
+                queue_size=self._settings["writer_queue_size"],
+                workers=self._settings["writer_threads"],
+                encoders=IMAGE_ENCODERS,
+                previous=self._last_recorder,
+            )
+
+        lidar = self._sensor_data.get("Lidar", None)
+        if lidar is not None:
+            lidar = encode_sweep(lidar, self._settings["lidar_resolution"])
+        boxes = None
+        if self._box_projector is not None:
+            boxes = self._box_projector.project(
+                self._agents,
+                measurements.player_measurements.transform,
+                depth=self._sensor_data.get("DepthCamera", None),
+            )
+        self._recorder.put(frame, self._get_camera_images(), lidar, boxes)
 
         loc = measurements.player_measurements.transform.location
         speed = measurements.player_measurements.forward_speed * 3.6
         autopilot = measurements.player_measurements.autopilot_control
 
-        self._driving_history = self._driving_history.append(
-            pd.Series(
-                [
-                    f"imgs/{frame}_rgb_center.png",
-                    f"imgs/{frame}_rgb_left.png",
-                    f"imgs/{frame}_rgb_right.png",
-                    f"imgs/{frame}_depth.png",
-                    f"imgs/{frame}_sem_seg.png",
-                    (loc.x, loc.y),
-                    speed,
-                    (
-                        control.steer,
-                        control.throttle,
-                        control.brake,
-                        int(control.reverse),
-                    ),
-                    (
-                        autopilot.steer,
-                        autopilot.throttle,
-                        autopilot.brake,
-                        int(autopilot.reverse),
-                    ),
-                    0,
-                    self._current_speed_limit,
-                    self._current_traffic_light[0].value,
-                    int(self._autopilot_enabled),
-                    self._settings["weather_id"],
-                ],
-                index=self._driving_history.columns,
+        self._driving_history.append(
+            frame=frame,
+            timestamp=measurements.game_timestamp,
+            location=(loc.x, loc.y),
+            speed=speed,
+            controls=(
+                control.steer,
+                control.throttle,
+                control.brake,
+                int(control.reverse),
             ),
-            ignore_index=True,
+            ap_controls=(
+                autopilot.steer,
+                autopilot.throttle,
+                autopilot.brake,
+                int(autopilot.reverse),
+            ),
+            hlc=0,
+            speed_limit=self._current_speed_limit,
+            traffic_light=self._current_traffic_light[0].value,
+            autopilot_enabled=int(self._autopilot_enabled),
+            weather_id=self._settings["weather_id"],
+            lidar=lidar is not None,
         )
 
     def _write_history_to_disk(self):
-        path = Path(f"{self._output_path}/{self._timer.episode_timestamp_str}")
-        self._disk_writer_thread = ImageWriter(
-            path,
-            self._image_history,
-            self._driving_history,
-            self._frame_history,
-            on_complete=self._images_write_complete,
-        )
-        self._disk_writer_thread.start()
+        # The recorded frames are already streaming to disk, the recorder
+        # finishes in the background, after the previous recording of the
+        # episode so the driving log is appended in order.
+        if self._recorder is not None:
+            self._recorder.close(self._driving_history)
+            self._closed_recorders.append(self._recorder)
+            self._last_recorder = self._recorder
+            self._recorder = None
+        self._initialize_history()
+        self._game_state = GameState.NOT_RECORDING
 
     def _write_video_to_disk(self, on_complete=None):
         if on_complete is None:
@@ -546,10 +680,6 @@ class CarlaController:
         )
         self._disk_writer_thread.start()
 
-    def _images_write_complete(self):
-        self._game_state = GameState.NOT_RECORDING
-        self._initialize_history()
-
     def _video_write_complete(self):
         self._game_state = GameState.NOT_RECORDING
 
@@ -559,7 +689,7 @@ class CarlaController:
             self._measurements.player_measurements.transform, 12, -90, 15
         )
         if agent is not None:
-            new_state = agent.state
+            new_state = int(agent["state"])
 
             if new_dist <= old_dist:
                 self._current_traffic_light = (TrafficLight(new_state), new_dist)
@@ -573,7 +703,7 @@ class CarlaController:
             self._measurements.player_measurements.transform, 12, -90, 20
         )[0]
         if agent is not None:
-            self._current_speed_limit = int(agent.speed_limit * 3.6)
+            self._current_speed_limit = int(agent["speed"] * 3.6)
 
     def _on_loop(self):
 
@@ -593,6 +723,8 @@ class CarlaController:
                 if self._exit_flag:
                     return False
 
+            self._release_sensor_data()
+            self._update_sensor_subscriptions()
             measurements, sensor_data = self.client.read_data()
             self._measurements = measurements
             self._sensor_data = sensor_data
@@ -603,7 +735,17 @@ class CarlaController:
             if self._record_video:
                 self._prepare_video_images()
 
-            self._traffic_lights.update_agents(measurements.non_player_agents)
+            kinds = ("traffic_light", "speed_limit_sign")
+            if (
+                self._box_projector is not None
+                and self._game_state == GameState.RECORDING
+            ):
+                kinds += ("vehicle", "pedestrian")
+            agents = decode_non_player_agents(
+                measurements.non_player_agents, kinds=kinds
+            )
+            self._agents = agents
+            self._traffic_lights.update_agents(agents)
 
             if not self._traffic_lights.valid:
                 self._traffic_lights.initialize_KD_tree()
@@ -611,7 +753,7 @@ class CarlaController:
                 self._update_current_traffic_light()
 
             if not self._speed_limits.valid:
-                self._speed_limits.update_agents(measurements.non_player_agents)
+                self._speed_limits.update_agents(agents)
                 self._speed_limits.initialize_KD_tree()
             else:
                 self._update_current_speed_limit()
@@ -626,7 +768,7 @@ class CarlaController:
 
             if self._drive_model and self._drive_model_enabled:
                 control = self._get_drive_model_control(control)
-            print(control)
+            logging.debug("%s", control)
             self.client.send_control(control)
 
             if self._game_state == GameState.RECORDING:
@@ -635,8 +777,8 @@ class CarlaController:
         if self._settings["frame_limit"] != 0:
             if self._settings["frame_limit"] < self._timer.episode_frame:
                 if self._game_state == GameState.RECORDING:
-                    self._game_state = GameState.WRITING
                     if self._record_video:
+                        self._game_state = GameState.WRITING
                         self._write_video_to_disk(
                             on_complete=self._write_history_to_disk
                         )
@@ -647,29 +789,51 @@ class CarlaController:
                     self._write_video_to_disk()
                 self._new_episode_flag = True
 
-        self._render_pygame()
+        if not self._headless:
+            self._render_pygame()
 
     def execute(self):
         """ TODO: Write docstring """
-        pygame.init()
+        if self._headless:
+            # Unattended data generation: read, control and record, nothing
+            # is displayed and the vehicle drives on autopilot or drive model.
+            self._autopilot_enabled = True
+            if self._drive_model_path:
+                self._drive_model_enabled = True
+                self._current_hlc = HighLevelCommand.FOLLOW_ROAD
+            if not self._settings["autostart_recording"]:
+                logging.warning("Headless without AutoStartRecording records nothing")
+        else:
+            _import_pygame()
+            pygame.init()
 
         self._initialize_carla()
-        self._initialize_pygame()
+        if self._headless:
+            self._on_new_episode()
+        else:
+            self._initialize_pygame()
         self._initialize_drive_model()
         if self._output_path is not None:
             logging.info("Recorded data will be saved to: %s", self._output_path)
         try:
             while True:
-                for event in pygame.event.get():
-                    if event.type == pygame.QUIT:
-                        return
-                    if event.type == pl.KEYDOWN:
-                        self._handle_keydown_event(event.key)
+                if not self._headless:
+                    for event in pygame.event.get():
+                        if event.type == pygame.QUIT:
+                            return
+                        if event.type == pl.KEYDOWN:
+                            self._handle_keydown_event(event.key)
 
                 if self._on_loop() is False:
                     break
         finally:
-            pygame.quit()
+            if self._game_state == GameState.RECORDING:
+                self._write_history_to_disk()
+            if not self._exit_flag:
+                self._log_episode_fps()
+            self._report_recorder_errors(wait=True)
+            if not self._headless:
+                pygame.quit()
 
 
 def main():
@@ -682,6 +846,11 @@ def main():
         dest="debug",
         help="print debug information",
     )
+    argparser.add_argument(
+        "--check-frames",
+        action="store_true",
+        help="poison released sensor frames and raise on use after release (slow)",
+    )
     argparser.add_argument(
         "--host",
         metavar="H",
@@ -717,6 +886,11 @@ def main():
         default="output",
         help="recorded data will be saved to this path",
     )
+    argparser.add_argument(
+        "--headless",
+        action="store_true",
+        help="generate data without a window, driving on autopilot or drive model",
+    )
     argparser.add_argument(
         "-m",
         "--model",
@@ -726,6 +900,8 @@ def main():
         help="path to drive model",
     )
     args = argparser.parse_args()
+    if args.headless and args.record_video:
+        argparser.error("--record-video needs the game cameras, not available headless")
 
     settings = configparser.ConfigParser()
     settings.read("settings.ini")
@@ -737,7 +913,10 @@ def main():
 
     while True:
         try:
-            with make_carla_client(args.host, args.port) as client:
+            frame_arena = FrameArena(debug=args.check_frames)
+            with make_carla_client(
+                args.host, args.port, frame_arena=frame_arena
+            ) as client:
                 game = CarlaController(client, args, settings)
                 game.execute()
                 break
@@ -1,43 +1,174 @@
 """
-TODO: Write Docstring
+Writing of the recorded episodes to disk.
+
+An episode is written to its own directory: the camera images as PNGs in
+"imgs", the lidar sweeps in lidar.bin (see lidar_log), and one row per
+recorded frame in driving_log.csv, plus one row per visible box in
+bounding_boxes.csv when boxes are projected. EpisodeRecorder writes the
+frames in the background while driving and VideoWriter renders the
+recorded camera images to videos.
 """
-from threading import Thread
+from queue import Queue
+from threading import Lock, Thread
+import logging
 import os
 import cv2
+import numpy as np
+import pandas as pd
 
+from lidar_log import LidarLogWriter
 
-class ImageWriter(Thread):
-    """ TODO: Write Docstring """
 
-    def __init__(self, episode_path, images, driving_log, frames, on_complete=None):
-        Thread.__init__(self)
-        self.progress = 0.0
-        self._images = images
-        self._driving_log = driving_log
-        self._frames = frames
+class EpisodeRecorder:
+    """
+    Streams the frames recorded in an episode to disk while driving.
+
+    Frames are put on a bounded queue as they are captured and written by
+    worker threads, so memory is bounded by the queue size and not by the
+    length of the recording. Images can be queued in a compact form, the
+    workers convert them with the function of their name in "encoders".
+    Closing the recorder finishes the queue, the bounding boxes and the
+    driving log in the background. A frame that fails to be written is
+    logged and skipped, the first error is kept in "error".
+
+    "previous" is the closed recorder of the previous recording, if any.
+    If it recorded to the same episode directory, the lidar log is only
+    opened once it is done, so a single writer appends to lidar.bin at a
+    time, and the driving log is appended after its own.
+    """
+
+    def __init__(
+        self, episode_path, queue_size=32, workers=2, encoders=None, previous=None
+    ):
         self._episode_path = episode_path
-        self._on_complete = on_complete
+        if previous is not None and previous.episode_path != episode_path:
+            previous = None
+        self._previous = previous
+        self._encoders = encoders or {}
+        self._image_path = episode_path / "imgs"
+        self._image_path.mkdir(parents=True, exist_ok=True)
+        self._queue = Queue(maxsize=queue_size)
+        self._lidar_log = None
+        self._lidar_lock = Lock()
+        self._box_frames = []
+        self._bounding_boxes = []
+        self._finisher = None
+        self.error = None
+        self._workers = [Thread(target=self._work) for _ in range(workers)]
+        for worker in self._workers:
+            worker.start()
 
-    def run(self):
-        image_path = self._episode_path / "imgs"
-        image_path.mkdir(parents=True, exist_ok=True)
+    @property
+    def episode_path(self):
+        """ Directory the episode is written to """
+        return self._episode_path
 
-        for i in range(len(self._images)):
-            for key, value in self._images[i].items():
-                image = value
-                filename = f"{self._frames[i]}_{key}.png"
-                path = image_path / filename
-                cv2.imwrite(str(path), image)
-            self.progress = (i + 1) / len(self._images)
-
-        csv_path = f"{str(self._episode_path)}/driving_log.csv"
-        if not os.path.isfile(csv_path):
-            self._driving_log.to_csv(csv_path)
-        else:
-            self._driving_log.to_csv(csv_path, mode="a", header=False)
+    def put(self, frame, images, lidar_sweep=None, bounding_boxes=None):
+        """ Queue a recorded frame, blocks while the queue is full """
+        if bounding_boxes is not None:
+            self._box_frames.append(frame)
+            self._bounding_boxes.append(bounding_boxes)
+        self._queue.put((frame, images, lidar_sweep))
 
-        if self._on_complete is not None:
-            self._on_complete()
+    def close(self, driving_history, on_complete=None):
+        """
+        Write the remaining frames, then the bounding boxes and the
+        driving_history.DrivingHistory of the recording, without blocking.
+        """
+        self._finisher = Thread(
+            target=self._finish, args=(driving_history, on_complete)
+        )
+        self._finisher.start()
+
+    def join(self):
+        """ Wait until everything is written """
+        if self._finisher is not None:
+            self._finisher.join()
+
+    def done(self):
+        """ Whether the recorder was closed and everything is written """
+        return self._finisher is not None and not self._finisher.is_alive()
+
+    def _work(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            # Keep draining the queue on errors, a dead worker would leave
+            # put() and close() blocked on a full queue.
+            try:
+                self._write(*item)
+            except Exception as error:
+                logging.exception("Failed to write frame %s", item[0])
+                if self.error is None:
+                    self.error = error
+
+    def _write(self, frame, images, lidar_sweep):
+        for key, image in images.items():
+            encoder = self._encoders.get(key)
+            if encoder is not None:
+                image = encoder(image)
+            cv2.imwrite(str(self._image_path / f"{frame}_{key}.png"), image)
+        if lidar_sweep is not None:
+            with self._lidar_lock:
+                if self._lidar_log is None:
+                    if self._previous is not None:
+                        self._previous.join()
+                    self._lidar_log = LidarLogWriter(self._episode_path / "lidar.bin")
+                self._lidar_log.write(frame, lidar_sweep)
+
+    def _finish(self, driving_history, on_complete):
+        for _ in self._workers:
+            self._queue.put(None)
+        for worker in self._workers:
+            worker.join()
+        if self._lidar_log is not None:
+            self._lidar_log.close()
+
+        if self._previous is not None:
+            self._previous.join()
+            self._previous = None
+
+        if self._bounding_boxes:
+            _append_csv(
+                _boxes_to_dataframe(self._box_frames, self._bounding_boxes),
+                self._episode_path / "bounding_boxes.csv",
+                index=False,
+            )
+
+        _append_csv(
+            driving_history.to_dataframe(), self._episode_path / "driving_log.csv"
+        )
+
+        if on_complete is not None:
+            on_complete()
+
+
+def _append_csv(dataframe, path, index=True):
+    if not os.path.isfile(path):
+        dataframe.to_csv(path, index=index)
+    else:
+        dataframe.to_csv(path, mode="a", header=False, index=index)
+
+
+def _boxes_to_dataframe(frames, bounding_boxes):
+    """ One row per box of carla.projection.BOX_DTYPE, tagged with its frame """
+    boxes = np.concatenate(bounding_boxes)
+    corners = boxes["corners"].reshape(len(boxes), 16).round(1)
+    return pd.DataFrame(
+        {
+            "Frame": np.repeat(frames, [len(b) for b in bounding_boxes]),
+            "ID": boxes["id"],
+            "Kind": boxes["kind"],
+            "XMin": boxes["bbox"][:, 0].round(1),
+            "YMin": boxes["bbox"][:, 1].round(1),
+            "XMax": boxes["bbox"][:, 2].round(1),
+            "YMax": boxes["bbox"][:, 3].round(1),
+            "Distance": boxes["distance"].round(2),
+            "Visibility": boxes["visibility"].round(3),
+            "Corners": [" ".join(map(str, row)) for row in corners.tolist()],
+        }
+    )
 
 
 class VideoWriter(Thread):
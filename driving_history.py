@@ -0,0 +1,129 @@
+"""
+Columnar storage of the driving log recorded during an episode.
+
+Every recorded frame appends one value per column to preallocated NumPy
+arrays that double in capacity when full, so recording a frame costs the
+same at the start and at the end of a long episode. The history is only
+turned into a DataFrame, in the driving_log.csv layout, when it is written.
+
+Label columns set after the fact, like the high-level command given a few
+seconds after the intersection was approached, are back-filled over a
+trailing window located by binary search, in O(window).
+"""
+import numpy as np
+import pandas as pd
+
+# Column name, dtype and shape of each value. "timestamp" is the game
+# timestamp of the frame in milliseconds.
+COLUMNS = (
+    ("frame", np.int64, ()),
+    ("timestamp", np.int64, ()),
+    ("location", np.float64, (2,)),
+    ("speed", np.float64, ()),
+    ("controls", np.float64, (4,)),
+    ("ap_controls", np.float64, (4,)),
+    ("hlc", np.int64, ()),
+    ("speed_limit", np.int64, ()),
+    ("traffic_light", np.int64, ()),
+    ("autopilot_enabled", np.int64, ()),
+    ("weather_id", np.int64, ()),
+    ("lidar", np.bool_, ()),
+)
+
+
+def _control_tuples(controls):
+    """ (steer, throttle, brake, reverse) tuples, reverse as an int """
+    return [(s, t, b, int(r)) for s, t, b, r in controls.tolist()]
+
+
+class DrivingHistory:
+    """
+    Growable NumPy columns holding one row per recorded frame. The "Lidar"
+    column of the driving log is only written if "lidar" is set or a frame
+    has a lidar sweep, so the log of a run without lidar keeps its layout.
+    """
+
+    def __init__(self, capacity=1024, lidar=False):
+        self.lidar = lidar
+        self._length = 0
+        self._columns = {
+            name: np.zeros((capacity,) + shape, dtype=dtype)
+            for name, dtype, shape in COLUMNS
+        }
+
+    def __len__(self):
+        return self._length
+
+    def append(self, **values):
+        """ Record one frame, missing columns are zero """
+        index = self._length
+        if index == len(self._columns["frame"]):
+            self._grow()
+        columns = self._columns
+        for name, value in values.items():
+            columns[name][index] = value
+        self._length = index + 1
+
+    def column(self, name):
+        """ Writable view of the recorded values of a column """
+        return self._columns[name][: self._length]
+
+    def window_start(self, frames=None, seconds=None):
+        """ Index of the first row of the last frames, or seconds of game time """
+        if (frames is None) == (seconds is None):
+            raise ValueError("give the window length either in frames or in seconds")
+        if not self._length:
+            return 0
+        if frames is not None:
+            column, length = self.column("frame"), frames
+        else:
+            column, length = self.column("timestamp"), seconds * 1000.0
+        return int(np.searchsorted(column, column[-1] - length, side="right"))
+
+    def backfill(self, name, value, frames=None, seconds=None, unset=0):
+        """
+        Set the rows of a column still at "unset" to value, over the trailing
+        window of the last frames or seconds (see window_start)
+        """
+        window = self.column(name)[self.window_start(frames, seconds) :]
+        window[window == unset] = value
+
+    def clear(self):
+        """ Drop the recorded frames, keeping the allocated capacity """
+        for column in self._columns.values():
+            column[: self._length] = 0
+        self._length = 0
+
+    def to_dataframe(self):
+        """ The recorded frames in the driving_log.csv layout """
+        frames = self.column("frame").tolist()
+        lidar = self.column("lidar")
+        dataframe = pd.DataFrame(
+            {
+                "CenterRGB": [f"imgs/{f}_rgb_center.png" for f in frames],
+                "LeftRGB": [f"imgs/{f}_rgb_left.png" for f in frames],
+                "RightRGB": [f"imgs/{f}_rgb_right.png" for f in frames],
+                "Depth": [f"imgs/{f}_depth.png" for f in frames],
+                "SemSeg": [f"imgs/{f}_sem_seg.png" for f in frames],
+                "Location": [tuple(l) for l in self.column("location").tolist()],
+                "Speed": self.column("speed"),
+                "Controls": _control_tuples(self.column("controls")),
+                "APControls": _control_tuples(self.column("ap_controls")),
+                "HLC": self.column("hlc"),
+                "SpeedLimit": self.column("speed_limit"),
+                "TrafficLight": self.column("traffic_light"),
+                "AutoPilotEnabled": self.column("autopilot_enabled"),
+                "WeatherID": self.column("weather_id"),
+            }
+        )
+        if self.lidar or lidar.any():
+            dataframe["Lidar"] = [
+                f"lidar.bin:{f}" if l else None for f, l in zip(frames, lidar.tolist())
+            ]
+        return dataframe
+
+    def _grow(self):
+        for name, column in self._columns.items():
+            grown = np.zeros((2 * len(column),) + column.shape[1:], dtype=column.dtype)
+            grown[: len(column)] = column
+            self._columns[name] = grown
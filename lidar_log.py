@@ -0,0 +1,128 @@
+"""
+Compact per-episode storage of lidar sweeps.
+
+A lidar log is one append-only file holding every recorded sweep of an
+episode, with the points quantized to int16, and an index file next to it
+mapping each episode frame to the offset of its sweep.
+"""
+import struct
+from pathlib import Path
+
+import numpy as np
+
+from carla.sensor import LidarMeasurement, PointCloud
+
+MAGIC = b"LIDARLOG"
+VERSION = 1
+DEFAULT_SCALE = 0.01  # Meters per quantization step, +-327 m range.
+
+_HEADER = struct.Struct("<8sL")
+# Frame number, horizontal angle, channels, scale.
+_SWEEP_HEADER = struct.Struct("<QfLf")
+_INDEX_DTYPE = np.dtype([("frame", "<u8"), ("offset", "<u8")])
+
+
+def index_path(path):
+    """ Path of the index of the lidar log at path """
+    path = Path(path)
+    return path.with_name(path.name + ".idx")
+
+
+def encode_sweep(measurement, scale=DEFAULT_SCALE):
+    """ Serialize a carla.sensor.LidarMeasurement with int16 points """
+    points = np.asarray(measurement.point_cloud.array, dtype=np.float32)
+    quantized = np.empty(points.shape, dtype=np.float32)
+    np.multiply(points, np.float32(1.0 / scale), out=quantized)
+    np.rint(quantized, out=quantized)
+    np.clip(quantized, -32768, 32767, out=quantized)
+    counts = np.asarray(measurement.point_count_by_channel, dtype="<u4")
+    return b"".join(
+        [
+            _SWEEP_HEADER.pack(
+                measurement.frame_number,
+                measurement.horizontal_angle,
+                measurement.channels,
+                scale,
+            ),
+            counts.tobytes(),
+            quantized.astype("<i2").tobytes(),
+        ]
+    )
+
+
+def decode_sweep(data):
+    """ Deserialize a sweep serialized by encode_sweep """
+    frame_number, horizontal_angle, channels, scale = _SWEEP_HEADER.unpack_from(data)
+    offset = _SWEEP_HEADER.size
+    counts = np.frombuffer(data, dtype="<u4", count=channels, offset=offset)
+    offset += 4 * channels
+    point_count = int(counts.sum())
+    quantized = np.frombuffer(data, dtype="<i2", count=3 * point_count, offset=offset)
+    points = quantized.reshape(point_count, 3) * np.float32(scale)
+    return LidarMeasurement(
+        frame_number,
+        horizontal_angle,
+        channels,
+        counts,
+        PointCloud(frame_number, points),
+    )
+
+
+class LidarLogWriter:
+    """ Appends encoded sweeps to a lidar log and its index """
+
+    def __init__(self, path):
+        self._file = open(path, "ab")
+        self._index = open(index_path(path), "ab")
+        if self._file.tell() == 0:
+            self._file.write(_HEADER.pack(MAGIC, VERSION))
+
+    def write(self, frame, sweep):
+        """ Append a sweep (an encode_sweep result) recorded at episode frame """
+        self._index.write(struct.pack("<QQ", frame, self._file.tell()))
+        self._file.write(struct.pack("<L", len(sweep)))
+        self._file.write(sweep)
+
+    def close(self):
+        self._file.close()
+        self._index.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+class LidarLogReader:
+    """ Random access to the sweeps of a lidar log by episode frame """
+
+    def __init__(self, path):
+        self._data = Path(path).read_bytes()
+        magic, version = _HEADER.unpack_from(self._data)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"{path} is not a lidar log")
+        self._index = np.fromfile(index_path(path), dtype=_INDEX_DTYPE)
+        self._offsets = {int(f): int(o) for f, o in self._index}
+
+    @property
+    def frames(self):
+        """ Episode frames with a sweep, in recording order """
+        return self._index["frame"]
+
+    def __len__(self):
+        return len(self._index)
+
+    def __contains__(self, frame):
+        return frame in self._offsets
+
+    def read(self, frame):
+        """ Return the carla.sensor.LidarMeasurement recorded at episode frame """
+        offset = self._offsets[frame]
+        length = struct.unpack_from("<L", self._data, offset)[0]
+        view = memoryview(self._data)[offset + 4 : offset + 4 + length]
+        return decode_sweep(view)
+
+    def __iter__(self):
+        for frame in self.frames:
+            yield int(frame), self.read(int(frame))
@@ -17,20 +17,13 @@ class NonPlayerObjects:
         yaw_diff = ((rot1 - rot2 + 180) % 360) - 180 + rot_dif
         return -thresh <= yaw_diff <= thresh
 
-    def update_agents(self, all_agents):
-        filtered = list(
-            filter(lambda agent: hasattr(agent, self._agent_type), all_agents)
-        )
-        self._agents = list(map(lambda a: getattr(a, self._agent_type), filtered))
+    def update_agents(self, agents):
+        # agents: dict of structured arrays from decode_non_player_agents
+        self._agents = agents[self._agent_type]
 
     def initialize_KD_tree(self):
-        locations = []
-        for agent in self._agents:
-            loc = agent.transform.location
-            locations.append([loc.x, loc.y, loc.z])
-
-        if locations:
-            self._KD_tree = spatial.KDTree(locations)
+        if len(self._agents):
+            self._KD_tree = spatial.KDTree(self._agents["location"])
             self.valid = True
 
     def get_closest_with_rotation(self, player_trans, radius, rot_dif, thresh):
@@ -48,7 +41,7 @@ class NonPlayerObjects:
 
         if distance < radius:
             closest_agent = self._agents[index]
-            agent_rot = closest_agent.transform.rotation.yaw
+            agent_rot = closest_agent["yaw"]
 
             if self._is_valid_rot(agent_rot, car_rot, rot_dif, thresh):
                 return closest_agent, distance
@@ -23,5 +23,9 @@ class Timer(object):
         self.episode_timestamp_str = self._get_timestamp_str(self._episode_timestamp)
         self.episode_num += 1
 
+    def episode_fps(self):
+        elapsed = time.time() - self._episode_timestamp
+        return self.episode_frame / elapsed if elapsed > 0 else 0.0
+
     def _get_timestamp_str(self, timestamp):
         return time.strftime("%Y-%m-%d_%H-%M-%S", time.localtime(timestamp))